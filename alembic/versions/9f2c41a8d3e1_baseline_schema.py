@@ -0,0 +1,131 @@
+"""baseline schema
+
+The schema exactly as Base.metadata.create_all used to emit it before
+migrations were introduced: native Postgres enum types and no secondary
+indexes beyond the column-level unique/index flags. Databases created by
+the old create_all should be stamped at this revision; the follow-up
+revision brings them up to the current model definitions.
+
+Revision ID: 9f2c41a8d3e1
+Revises:
+Create Date: 2026-08-30 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "9f2c41a8d3e1"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=True),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column(
+            "role",
+            sa.Enum("PATIENT", "DOCTOR", "ADMIN", name="userrole"),
+            nullable=False,
+        ),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_users_id"), "users", ["id"], unique=False)
+    op.create_index(op.f("ix_users_username"), "users", ["username"], unique=True)
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+
+    op.create_table(
+        "doctors",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("specialization", sa.String(), nullable=False),
+        sa.Column("bio", sa.String(), nullable=True),
+        sa.Column("working_hours", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "patients",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("date_of_birth", sa.DateTime(), nullable=True),
+        sa.Column("blood_group", sa.String(), nullable=True),
+        sa.Column("allergies", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "appointments",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("patient_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("doctor_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "WAITING", "IN_PROGRESS", "COMPLETED", "CANCELLED",
+                name="appointmentstatus",
+            ),
+            nullable=True,
+        ),
+        sa.Column("scheduled_time", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["patient_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["doctor_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "consultations",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("appointment_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "type",
+            sa.Enum("CHAT", "VIDEO", name="consultationtype"),
+            nullable=False,
+        ),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("ended_at", sa.DateTime(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["appointment_id"], ["appointments.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("consultation_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("sender_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["consultation_id"], ["consultations.id"]),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("messages")
+    op.drop_table("consultations")
+    op.drop_table("appointments")
+    op.drop_table("patients")
+    op.drop_table("doctors")
+    op.drop_index(op.f("ix_users_email"), table_name="users")
+    op.drop_index(op.f("ix_users_username"), table_name="users")
+    op.drop_index(op.f("ix_users_id"), table_name="users")
+    op.drop_table("users")
+    sa.Enum(name="userrole").drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name="appointmentstatus").drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name="consultationtype").drop(op.get_bind(), checkfirst=False)
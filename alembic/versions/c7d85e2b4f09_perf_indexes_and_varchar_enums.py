@@ -0,0 +1,103 @@
+"""perf indexes and varchar enums
+
+Brings a baseline database up to the current model definitions: the
+secondary indexes added through the performance series (including the
+partial unique index that closes the double-booking race and the unique
+index backing start_consultation's IntegrityError path), the
+case-insensitive unique email index, and the native enum -> VARCHAR +
+CHECK conversion.
+
+Revision ID: c7d85e2b4f09
+Revises: 9f2c41a8d3e1
+Create Date: 2026-08-30 10:14:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c7d85e2b4f09"
+down_revision = "9f2c41a8d3e1"
+branch_labels = None
+depends_on = None
+
+# (table, column, enum type name, labels) for the native-enum -> VARCHAR move
+_ENUM_COLUMNS = [
+    ("users", "role", "userrole", ("PATIENT", "DOCTOR", "ADMIN"), False),
+    (
+        "appointments", "status", "appointmentstatus",
+        ("WAITING", "IN_PROGRESS", "COMPLETED", "CANCELLED"), True,
+    ),
+    ("consultations", "type", "consultationtype", ("CHAT", "VIDEO"), False),
+]
+
+
+def upgrade() -> None:
+    # Native enums -> VARCHAR(16) + CHECK. Values are the enum member
+    # names either way, so the cast preserves every stored row.
+    for table, column, type_name, labels, nullable in _ENUM_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.String(length=16),
+            existing_nullable=nullable,
+            postgresql_using=f"{column}::varchar(16)",
+        )
+        op.create_check_constraint(
+            f"ck_{table}_{column}", table,
+            sa.column(column).in_(labels),
+        )
+        op.execute(f"DROP TYPE {type_name}")
+
+    # Covers the booking conflict check and doctor schedule queries
+    op.create_index(
+        "ix_appt_doctor_time_status", "appointments",
+        ["doctor_id", "scheduled_time", "status"],
+    )
+    # Covers patient appointment listings ordered by scheduled_time
+    op.create_index(
+        "ix_appt_patient_time", "appointments",
+        ["patient_id", "scheduled_time"],
+    )
+    # The database enforces "one active appointment per doctor per slot"
+    op.create_index(
+        "ux_appt_doctor_time_active", "appointments",
+        ["doctor_id", "scheduled_time"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('WAITING', 'IN_PROGRESS')"),
+    )
+    # One consultation per appointment; index-only existence probe
+    op.create_index(
+        "ux_consultation_appointment", "consultations",
+        ["appointment_id"], unique=True,
+    )
+    # Serves "WHERE consultation_id = ? ORDER BY timestamp" as a range scan
+    op.create_index(
+        "ix_message_consult_ts", "messages",
+        ["consultation_id", "timestamp"],
+    )
+    # Case-insensitive email uniqueness; rows are lowercased on write but
+    # the index also arbitrates legacy mixed-case data
+    op.create_index(
+        "ix_users_email_lower", "users",
+        [sa.text("lower(email)")], unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_email_lower", table_name="users")
+    op.drop_index("ix_message_consult_ts", table_name="messages")
+    op.drop_index("ux_consultation_appointment", table_name="consultations")
+    op.drop_index("ux_appt_doctor_time_active", table_name="appointments")
+    op.drop_index("ix_appt_patient_time", table_name="appointments")
+    op.drop_index("ix_appt_doctor_time_status", table_name="appointments")
+
+    for table, column, type_name, labels, nullable in _ENUM_COLUMNS:
+        op.drop_constraint(f"ck_{table}_{column}", table, type_="check")
+        enum_type = sa.Enum(*labels, name=type_name)
+        enum_type.create(op.get_bind(), checkfirst=False)
+        op.alter_column(
+            table, column,
+            type_=enum_type,
+            existing_nullable=nullable,
+            postgresql_using=f"{column}::{type_name}",
+        )
@@ -1,12 +1,16 @@
+import orjson
 from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from uuid import UUID
-import statistics
 
+from config import settings
 from core.auth import get_current_active_admin
+from core.cache import cache_clear_prefix, redis
 from core.security import get_password_hash
-from database import get_db
+from database import get_async_db
 from models.user import User, Doctor, Patient, UserRole
 from models.appointment import Appointment, AppointmentStatus
 from models.consultation import Consultation, ConsultationType
@@ -19,37 +23,43 @@ from schemas.user import (
 router = APIRouter()
 
 
-@router.get("/stats", response_model=dict)
-def get_stats(
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_active_admin),
-) -> Any:
+# Cache keys for the /stats endpoint. The TTL'd key absorbs dashboard polls;
+# the "last_good" key (no TTL) is served if the database is briefly slow.
+STATS_CACHE_KEY = "klinika:stats"
+STATS_LAST_GOOD_KEY = "klinika:stats:last_good"
+
+
+async def compute_stats(db: AsyncSession) -> dict:
     """
-    Get system statistics for admin dashboard.
+    Compute system statistics for the admin dashboard.
     """
-    # Count users by role
-    total_users = db.query(User).count()
-    total_patients = db.query(User).filter(User.role == UserRole.PATIENT).count()
-    total_doctors = db.query(User).filter(User.role == UserRole.DOCTOR).count()
-
-    # Count appointments by status
-    waiting_appointments = db.query(Appointment).filter(Appointment.status == AppointmentStatus.WAITING).count()
-    completed_appointments = db.query(Appointment).filter(Appointment.status == AppointmentStatus.COMPLETED).count()
-    cancelled_appointments = db.query(Appointment).filter(Appointment.status == AppointmentStatus.CANCELLED).count()
-
-    # Count consultations by type
-    chat_consultations = db.query(Consultation).filter(Consultation.type == ConsultationType.CHAT).count()
-    video_consultations = db.query(Consultation).filter(Consultation.type == ConsultationType.VIDEO).count()
-
-    # Calculate consultation durations
-    consultation_durations = []
-    completed_consultations = db.query(Consultation).filter(Consultation.ended_at.isnot(None)).all()
-    for cons in completed_consultations:
-        if cons.started_at and cons.ended_at:
-            duration_minutes = (cons.ended_at - cons.started_at).total_seconds() / 60
-            consultation_durations.append(duration_minutes)
-
-    avg_consultation_duration = statistics.mean(consultation_durations) if consultation_durations else 0
+    # Count users by role in a single aggregated query
+    total_users, total_patients, total_doctors = (await db.execute(select(
+        func.count(User.id),
+        func.count(User.id).filter(User.role == UserRole.PATIENT),
+        func.count(User.id).filter(User.role == UserRole.DOCTOR),
+    ))).one()
+
+    # Count appointments by status in a single aggregated query
+    waiting_appointments, completed_appointments, cancelled_appointments = (await db.execute(select(
+        func.count(Appointment.id).filter(Appointment.status == AppointmentStatus.WAITING),
+        func.count(Appointment.id).filter(Appointment.status == AppointmentStatus.COMPLETED),
+        func.count(Appointment.id).filter(Appointment.status == AppointmentStatus.CANCELLED),
+    ))).one()
+
+    # Count consultations by type and let the DB compute the average duration
+    chat_consultations, video_consultations, avg_consultation_duration = (await db.execute(select(
+        func.count(Consultation.id).filter(Consultation.type == ConsultationType.CHAT),
+        func.count(Consultation.id).filter(Consultation.type == ConsultationType.VIDEO),
+        func.avg(
+            func.extract("epoch", Consultation.ended_at - Consultation.started_at) / 60
+        ).filter(
+            Consultation.ended_at.isnot(None),
+            Consultation.started_at.isnot(None),
+        ),
+    ))).one()
+
+    avg_consultation_duration = float(avg_consultation_duration or 0)
 
     return {
         "users": {
@@ -73,9 +83,51 @@ def get_stats(
     }
 
 
-@router.get("/users", response_model=List[UserSchema])
-def get_users(
-        db: Session = Depends(get_db),
+@router.get("/stats", response_model=dict)
+async def get_stats(
+        db: AsyncSession = Depends(get_async_db),
+        current_user: User = Depends(get_current_active_admin),
+) -> Any:
+    """
+    Get system statistics for admin dashboard.
+
+    The response is cached in Redis for a short TTL; if the database is
+    temporarily unavailable, the last successfully computed payload is
+    returned instead of an error.
+    """
+    try:
+        cached = await redis.get(STATS_CACHE_KEY)
+    except Exception:
+        cached = None
+    if cached:
+        return orjson.loads(cached)
+
+    try:
+        stats = await compute_stats(db)
+    except Exception:
+        # Database briefly slow/unavailable: serve the last known payload
+        try:
+            stale = await redis.get(STATS_LAST_GOOD_KEY)
+        except Exception:
+            stale = None
+        if stale:
+            return orjson.loads(stale)
+        raise
+
+    payload = orjson.dumps(stats)
+    try:
+        await redis.set(STATS_CACHE_KEY, payload, ex=settings.STATS_CACHE_TTL)
+        await redis.set(STATS_LAST_GOOD_KEY, payload)
+    except Exception:
+        # Redis being down must not break the dashboard
+        pass
+
+    return stats
+
+
+@router.get("/users", response_model=List[UserSchema], response_model_exclude_none=True)
+async def get_users(
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_admin),
         skip: int = 0,
         limit: int = 100,
@@ -84,28 +136,39 @@ def get_users(
     """
     Get all users with optional filtering by role.
     """
-    query = db.query(User)
+    query = select(
+        User.id,
+        User.username,
+        User.email,
+        User.full_name,
+        User.role,
+        User.is_active,
+        User.created_at,
+        User.updated_at,
+    )
 
     if role:
-        query = query.filter(User.role == role)
+        query = query.where(User.role == role)
 
-    users = query.offset(skip).limit(limit).all()
-    return users
+    rows = (await db.execute(query.offset(skip).limit(limit))).all()
+    # Build the schema objects straight from the column tuples — no ORM
+    # hydration and no Pydantic validation (the DB already enforces types)
+    return [UserSchema.model_construct(**row._mapping) for row in rows]
 
 
 @router.post("/add-doctor", response_model=DoctorInDB)
-def create_doctor(
+async def create_doctor(
         doctor_in: DoctorCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_admin),
 ) -> Any:
     """
     Create a new doctor account.
     """
     # Check if user with this email or username already exists
-    user_exists = db.query(User).filter(
+    user_exists = (await db.execute(select(User).where(
         (User.email == doctor_in.user.email) | (User.username == doctor_in.user.username)
-    ).first()
+    ))).scalars().first()
 
     if user_exists:
         raise HTTPException(
@@ -113,17 +176,22 @@ def create_doctor(
             detail="User with this email or username already exists",
         )
 
+    # Hash the password in the threadpool — bcrypt is ~100ms of pure CPU
+    # and must not stall the event loop
+    password_hash = await run_in_threadpool(get_password_hash, doctor_in.user.password)
+
     # Create user with doctor role
     user = User(
         email=doctor_in.user.email,
         username=doctor_in.user.username,
         full_name=doctor_in.user.full_name,
-        password_hash=get_password_hash(doctor_in.user.password),
+        password_hash=password_hash,
         role=UserRole.DOCTOR,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    # Flush assigns user.id without ending the transaction, so both rows
+    # land in a single commit and a failed profile insert rolls back the user
+    await db.flush()
 
     # Create doctor profile
     doctor = Doctor(
@@ -133,25 +201,27 @@ def create_doctor(
         working_hours=doctor_in.working_hours,
     )
     db.add(doctor)
-    db.commit()
-    db.refresh(doctor)
+    await db.commit()
+
+    # The cached doctor-roster pages no longer include the new doctor
+    await cache_clear_prefix("klinika:doctors:")
 
-    return {"id": doctor.id, "user": user, **doctor_in.dict()}
+    return {"id": doctor.id, "user": user, **doctor_in.model_dump()}
 
 
 @router.post("/add-patient", response_model=PatientInDB)
-def create_patient(
+async def create_patient(
         patient_in: PatientCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_admin),
 ) -> Any:
     """
     Create a new patient account.
     """
     # Check if user with this email or username already exists
-    user_exists = db.query(User).filter(
+    user_exists = (await db.execute(select(User).where(
         (User.email == patient_in.user.email) | (User.username == patient_in.user.username)
-    ).first()
+    ))).scalars().first()
 
     if user_exists:
         raise HTTPException(
@@ -159,17 +229,22 @@ def create_patient(
             detail="User with this email or username already exists",
         )
 
+    # Hash the password in the threadpool — bcrypt is ~100ms of pure CPU
+    # and must not stall the event loop
+    password_hash = await run_in_threadpool(get_password_hash, patient_in.user.password)
+
     # Create user with patient role
     user = User(
         email=patient_in.user.email,
         username=patient_in.user.username,
         full_name=patient_in.user.full_name,
-        password_hash=get_password_hash(patient_in.user.password),
+        password_hash=password_hash,
         role=UserRole.PATIENT,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    # Flush assigns user.id without ending the transaction, so both rows
+    # land in a single commit and a failed profile insert rolls back the user
+    await db.flush()
 
     # Create patient profile
     patient = Patient(
@@ -179,10 +254,9 @@ def create_patient(
         allergies=patient_in.allergies,
     )
     db.add(patient)
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
 
-    return {"id": patient.id, "user": user, **patient_in.dict()}
+    return {"id": patient.id, "user": user, **patient_in.model_dump()}
 
 
 # @router.delete("/user/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -1,10 +1,20 @@
+import orjson
 from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+import jwt
+from jwt import InvalidTokenError as JWTError
+from sqlalchemy import and_, bindparam, exists, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
+
+from config import settings
 from core.auth import get_current_user, get_current_active_patient
-from database import get_db
+from core.security import SIGNING_KEY
+from core.websockets import manager
+from database import AsyncSessionLocal, get_async_db
 from models.user import User, UserRole
 from models.appointment import Appointment, AppointmentStatus
 from schemas.appointment import (
@@ -15,57 +25,82 @@ from schemas.appointment import (
 
 router = APIRouter()
 
+# Hot statements are built once at import time; SQLAlchemy caches the
+# compiled SQL keyed on construct identity, so per-request clause-tree
+# construction and compilation are skipped entirely
+_DOCTOR_EXISTS_STMT = select(
+    exists().where(and_(
+        User.id == bindparam("doctor_id"),
+        User.role == UserRole.DOCTOR,
+        User.is_active == True,
+    ))
+)
+
+_APPOINTMENT_BY_ID_STMT = (
+    select(Appointment)
+    .options(raiseload("*"))
+    .where(Appointment.id == bindparam("appointment_id"))
+)
+
 
 @router.post("/", response_model=AppointmentSchema)
-def create_appointment(
+async def create_appointment(
         appointment_in: AppointmentCreate,
-        db: Session = Depends(get_db),
+        background_tasks: BackgroundTasks,
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_patient),
 ) -> Any:
     """
     Create new appointment for current patient.
     """
-    # Check if doctor exists
-    doctor = db.query(User).filter(
-        User.id == appointment_in.doctor_id,
-        User.role == UserRole.DOCTOR,
-        User.is_active == True
-    ).first()
-    if not doctor:
+    # Check if doctor exists with an EXISTS probe — no row materialization
+    doctor_exists = (await db.execute(
+        _DOCTOR_EXISTS_STMT, {"doctor_id": appointment_in.doctor_id}
+    )).scalar()
+    if not doctor_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Doctor not found",
         )
 
-    # Check if the doctor already has an appointment at this time
-    existing_appointment = db.query(Appointment).filter(
-        Appointment.doctor_id == appointment_in.doctor_id,
-        Appointment.scheduled_time == appointment_in.scheduled_time,
-        Appointment.status.in_([AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS])
-    ).first()
-
-    if existing_appointment:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Doctor already has an appointment at this time",
-        )
-
-    # Create new appointment
+    # Create new appointment; the partial unique index on
+    # (doctor_id, scheduled_time) enforces slot availability atomically
     appointment = Appointment(
         patient_id=current_user.id,
         doctor_id=appointment_in.doctor_id,
         scheduled_time=appointment_in.scheduled_time,
     )
     db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Doctor already has an appointment at this time",
+        )
+    # No refresh needed: id/status/timestamps are client-side defaults and
+    # already populated on the instance
+
+    # Notify the doctor after the response is sent
+    background_tasks.add_task(
+        manager.send_personal_message,
+        orjson.dumps({
+            "type": "appointment_created",
+            "appointment_id": appointment.id,
+            "patient_id": appointment.patient_id,
+            "scheduled_time": appointment.scheduled_time,
+            "status": appointment.status.value,
+        }).decode(),
+        f"doctor_{appointment.doctor_id}",
+    )
 
     return appointment
 
 
 @router.get("/me", response_model=List[AppointmentSchema])
-def get_my_appointments(
-        db: Session = Depends(get_db),
+async def get_my_appointments(
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user),
         status: AppointmentStatus = None,
         start_date: datetime = None,
@@ -74,41 +109,45 @@ def get_my_appointments(
     """
     Get current user appointments.
     """
-    query = db.query(Appointment)
+    # The response schema serializes no relationships; raiseload makes any
+    # accidental lazy load fail loudly instead of silently becoming an N+1
+    query = select(Appointment).options(raiseload("*"))
 
     # Filter by patient or doctor
     if current_user.role == UserRole.PATIENT:
-        query = query.filter(Appointment.patient_id == current_user.id)
+        query = query.where(Appointment.patient_id == current_user.id)
     elif current_user.role == UserRole.DOCTOR:
-        query = query.filter(Appointment.doctor_id == current_user.id)
+        query = query.where(Appointment.doctor_id == current_user.id)
 
     # Apply additional filters if provided
     if status:
-        query = query.filter(Appointment.status == status)
+        query = query.where(Appointment.status == status)
 
     if start_date:
-        query = query.filter(Appointment.scheduled_time >= start_date)
+        query = query.where(Appointment.scheduled_time >= start_date)
 
     if end_date:
-        query = query.filter(Appointment.scheduled_time <= end_date)
+        query = query.where(Appointment.scheduled_time <= end_date)
 
-    # Sort by scheduled time (newest first)
+    # Sort by scheduled time
     query = query.order_by(Appointment.scheduled_time)
 
-    appointments = query.all()
+    appointments = (await db.execute(query)).scalars().all()
     return appointments
 
 
 @router.get("/{appointment_id}", response_model=AppointmentSchema)
-def get_appointment(
+async def get_appointment(
         appointment_id: UUID,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get appointment by ID.
     """
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = (await db.execute(
+        _APPOINTMENT_BY_ID_STMT, {"appointment_id": appointment_id}
+    )).scalar_one_or_none()
 
     if not appointment:
         raise HTTPException(
@@ -129,16 +168,19 @@ def get_appointment(
 
 
 @router.put("/{appointment_id}", response_model=AppointmentSchema)
-def update_appointment(
+async def update_appointment(
         appointment_id: UUID,
         appointment_in: AppointmentUpdate,
-        db: Session = Depends(get_db),
+        background_tasks: BackgroundTasks,
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Update appointment.
     """
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = (await db.execute(
+        _APPOINTMENT_BY_ID_STMT, {"appointment_id": appointment_id}
+    )).scalar_one_or_none()
 
     if not appointment:
         raise HTTPException(
@@ -162,25 +204,42 @@ def update_appointment(
         )
 
     # Update appointment attributes that are provided
-    for key, value in appointment_in.dict(exclude_unset=True).items():
+    for key, value in appointment_in.model_dump(exclude_unset=True).items():
         setattr(appointment, key, value)
 
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
+
+    # Notify both participants after the response is sent; the payload is
+    # identical for both, so it is serialized once
+    payload = orjson.dumps({
+        "type": "appointment_status_update",
+        "appointment_id": appointment.id,
+        "status": appointment.status.value,
+        "scheduled_time": appointment.scheduled_time,
+    }).decode()
+    background_tasks.add_task(
+        manager.broadcast_many,
+        payload,
+        [f"patient_{appointment.patient_id}", f"doctor_{appointment.doctor_id}"],
+    )
 
     return appointment
 
 
 @router.put("/{appointment_id}/cancel", response_model=AppointmentSchema)
-def cancel_appointment(
+async def cancel_appointment(
         appointment_id: UUID,
-        db: Session = Depends(get_db),
+        background_tasks: BackgroundTasks,
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Cancel an appointment.
     """
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = (await db.execute(
+        _APPOINTMENT_BY_ID_STMT, {"appointment_id": appointment_id}
+    )).scalar_one_or_none()
 
     if not appointment:
         raise HTTPException(
@@ -206,7 +265,139 @@ def cancel_appointment(
 
     # Cancel appointment
     appointment.status = AppointmentStatus.CANCELLED
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
+
+    # Notify both participants after the response is sent; the payload is
+    # identical for both, so it is serialized once
+    payload = orjson.dumps({
+        "type": "appointment_status_update",
+        "appointment_id": appointment.id,
+        "status": appointment.status.value,
+    }).decode()
+    background_tasks.add_task(
+        manager.broadcast_many,
+        payload,
+        [f"patient_{appointment.patient_id}", f"doctor_{appointment.doctor_id}"],
+    )
+
+    return appointment
 
-    return appointment
\ No newline at end of file
+
+@router.websocket("/ws")
+async def websocket_endpoint(
+        websocket: WebSocket,
+        token: str = Query(...),
+) -> Any:
+    """
+    WebSocket endpoint for live appointment updates.
+
+    On connect, an initial snapshot is pushed: doctors receive today's
+    appointments, patients their active appointments with queue position.
+
+    The session is scoped to the auth lookup and snapshot queries rather
+    than taken as a dependency: a dependency-injected session stays
+    checked out (in an open transaction) for the connection's lifetime,
+    so a few dozen idle dashboards would exhaust the pool.
+    """
+    # Authenticate the connection from the token query parameter
+    try:
+        payload = jwt.decode(
+            token, SIGNING_KEY, algorithms=[settings.ALGORITHM]
+        )
+        user_id = payload.get("sub")
+    except JWTError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    updates = []
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(
+            select(User).where(User.id == user_id)
+        )).scalar_one_or_none()
+        if not user or not user.is_active:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        connection_id = f"{user.role.value}_{user.id}"
+
+        if user.role == UserRole.DOCTOR:
+            # Today's schedule, with patients eager-loaded in the same query.
+            # The half-open range keeps the predicate sargable so the
+            # (doctor_id, scheduled_time, status) index can be range-scanned
+            day_start = datetime.combine(date.today(), time.min)
+            day_end = day_start + timedelta(days=1)
+            appointments = (await db.execute(
+                select(Appointment)
+                .options(joinedload(Appointment.patient))
+                .where(
+                    Appointment.doctor_id == user.id,
+                    Appointment.scheduled_time >= day_start,
+                    Appointment.scheduled_time < day_end,
+                    Appointment.status.in_(
+                        [AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS]
+                    ),
+                )
+                .order_by(Appointment.scheduled_time)
+            )).scalars().all()
+            for appointment in appointments:
+                updates.append({
+                    "type": "appointment_snapshot",
+                    "appointment_id": appointment.id,
+                    "patient_name": appointment.patient.full_name,
+                    "scheduled_time": appointment.scheduled_time,
+                    "status": appointment.status.value,
+                })
+        elif user.role == UserRole.PATIENT:
+            # Queue positions for every waiting appointment, computed once
+            # with a window function instead of one COUNT per appointment
+            waiting = (
+                select(
+                    Appointment.id.label("id"),
+                    func.row_number().over(
+                        partition_by=Appointment.doctor_id,
+                        order_by=Appointment.scheduled_time,
+                    ).label("position"),
+                )
+                .where(Appointment.status == AppointmentStatus.WAITING)
+                .cte("waiting_positions")
+            )
+
+            # Active appointments with doctor and queue position in one query
+            rows = (await db.execute(
+                select(Appointment, waiting.c.position)
+                .options(joinedload(Appointment.doctor))
+                .outerjoin(waiting, waiting.c.id == Appointment.id)
+                .where(
+                    Appointment.patient_id == user.id,
+                    Appointment.status.in_(
+                        [AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS]
+                    ),
+                )
+                .order_by(Appointment.scheduled_time)
+            )).all()
+            for appointment, position in rows:
+                updates.append({
+                    "type": "appointment_snapshot",
+                    "appointment_id": appointment.id,
+                    "doctor_name": appointment.doctor.full_name,
+                    "scheduled_time": appointment.scheduled_time,
+                    "status": appointment.status.value,
+                    "current_position": position,
+                    "estimated_time": position * 15 if position is not None else None,
+                })
+
+    # The session is released before the connection goes long-lived
+    await manager.connect(websocket, connection_id)
+
+    try:
+        # Coalesced by the manager into one JSON-array frame instead of
+        # a frame (and its protocol overhead) per appointment
+        for update in updates:
+            manager.queue_update(update, connection_id)
+
+        # Keep the connection open for subsequent status pushes
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        manager.disconnect(connection_id, websocket)
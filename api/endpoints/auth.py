@@ -2,13 +2,22 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from core.auth import get_current_user
-from core.security import verify_password, get_password_hash, create_access_token
-from database import get_db
-from models.user import User, UserRole
+from core.security import (
+    DUMMY_PASSWORD_HASH,
+    verify_password,
+    get_password_hash,
+    password_needs_rehash,
+    create_access_token,
+)
+from database import get_async_db
+from models.user import User, Doctor, Patient, UserRole
 from schemas.user import UserCreate, User as UserSchema, Token
 from config import settings
 
@@ -21,60 +30,68 @@ class LoginSchema(BaseModel):
 
 
 @router.post("/register", response_model=UserSchema)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     """
     Register a new user.
     """
-    # Check if user with this email or username already exists
-    user = db.query(User).filter(
-        (User.email == user_in.email) | (User.username == user_in.username)
-    ).first()
-    if user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with this email or username already exists",
-        )
+    # Hash the password in the threadpool so bcrypt does not stall the loop
+    password_hash = await run_in_threadpool(get_password_hash, user_in.password)
 
     # Create new user
     user = User(
         email=user_in.email,
         username=user_in.username,
         full_name=user_in.full_name,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=password_hash,
         role=user_in.role,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    # Flush assigns user.id without ending the transaction, so the user and
+    # profile rows commit atomically — one fsync, no orphan users. The
+    # unique constraints on email/username do duplicate detection here,
+    # replacing a racy pre-insert SELECT.
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email or username already exists",
+        )
 
     # If user is a doctor or patient, create corresponding entry
     if user.role == UserRole.DOCTOR:
-        from models.user import Doctor
         doctor = Doctor(id=user.id, specialization="General", bio="", working_hours="")
         db.add(doctor)
-        db.commit()
     elif user.role == UserRole.PATIENT:
-        from models.user import Patient
         patient = Patient(id=user.id)
         db.add(patient)
-        db.commit()
+
+    await db.commit()
+    await db.refresh(user)
 
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     login_data: LoginSchema,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Any:
     """
     Login user with email and password to get access token for website.
     """
     # Find user by email
-    user = db.query(User).filter(User.email == login_data.email).first()
-
-    # Check if user exists and password is correct
-    if not user or not verify_password(login_data.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == login_data.email))
+
+    # Always run a bcrypt verify — against a dummy hash if the user is
+    # missing — and check the user afterwards; verification runs in the
+    # threadpool so bcrypt does not stall the loop
+    password_hash = user.password_hash if user else DUMMY_PASSWORD_HASH
+    password_ok = await run_in_threadpool(
+        verify_password, login_data.password, password_hash
+    )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -88,10 +105,19 @@ def login(
             detail="Inactive user",
         )
 
+    # Transparently upgrade legacy bcrypt hashes to Argon2id while the
+    # plaintext is available
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await run_in_threadpool(
+            get_password_hash, login_data.password
+        )
+        await db.commit()
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=user.id, role=user.role.value, expires_delta=access_token_expires
+        subject=user.id, role=user.role.value, name=user.full_name,
+        expires_delta=access_token_expires
     )
 
     return {
@@ -101,18 +127,24 @@ def login(
 
 
 @router.post("/token", response_model=Token)
-def token(
-    db: Session = Depends(get_db),
+async def token(
+    db: AsyncSession = Depends(get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     Get access token for OAuth2 Bearer authentication (Swagger UI).
     """
     # Find user by username
-    user = db.query(User).filter(User.username == form_data.username).first()
-
-    # Check if user exists and password is correct
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+
+    # Always run a bcrypt verify — against a dummy hash if the user is
+    # missing — and check the user afterwards; verification runs in the
+    # threadpool so bcrypt does not stall the loop
+    password_hash = user.password_hash if user else DUMMY_PASSWORD_HASH
+    password_ok = await run_in_threadpool(
+        verify_password, form_data.password, password_hash
+    )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -126,10 +158,19 @@ def token(
             detail="Inactive user",
         )
 
+    # Transparently upgrade legacy bcrypt hashes to Argon2id while the
+    # plaintext is available
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await run_in_threadpool(
+            get_password_hash, form_data.password
+        )
+        await db.commit()
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=user.id, role=user.role.value, expires_delta=access_token_expires
+        subject=user.id, role=user.role.value, name=user.full_name,
+        expires_delta=access_token_expires
     )
 
     return {
@@ -143,4 +184,4 @@ def test_token(current_user: User = Depends(get_current_user)) -> Any:
     """
     Test access token.
     """
-    return current_user
\ No newline at end of file
+    return current_user
@@ -1,44 +1,120 @@
+import hashlib
+import uuid
 from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+import jwt
+from jwt import InvalidTokenError as JWTError
+import orjson
+from sqlalchemy import bindparam, exists, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from uuid import UUID
 from datetime import datetime
 
 from config import settings
 from core.auth import get_current_user, get_current_active_doctor
-from database import get_db
+from core.cache import cache_clear_prefix, cache_get, cache_set
+from core.message_buffer import message_buffer
+from core.security import SIGNING_KEY
+from core.websockets import manager
+from database import AsyncSessionLocal, get_async_db
+from dependencies import get_or_404
 from models.user import User, UserRole
 from models.appointment import Appointment, AppointmentStatus
 from models.consultation import Consultation, Message
 from schemas.consultation import (
     Consultation as ConsultationSchema,
     ConsultationCreate,
+    ConsultationPage,
+    ConsultationSummary,
     ConsultationUpdate,
     MessageCreate,
-    Message as MessageSchema
+    Message as MessageSchema,
+    MessagePage
 )
 
 router = APIRouter()
 
+# Per-user prefix for cached consultation listings. Keyed by the caller's
+# user id so one user's page can never be served to another.
+CONSULTS_CACHE_PREFIX = "klinika:consults:"
+
+# Statements built once at import: per-request construction and compilation
+# are skipped; only the bind parameters vary. (PK lookups go through
+# db.get(), which has its own compiled-statement fast path.)
+_USER_BY_ID_STMT = select(User).where(User.id == bindparam("uid"))
+_LAST_MESSAGE_TS_STMT = select(func.max(Message.timestamp)).where(
+    Message.consultation_id == bindparam("cid")
+)
+_CONSULTATION_EXISTS_STMT = select(
+    exists().where(Consultation.appointment_id == bindparam("aid"))
+)
+
+
+def _make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the freshness-relevant parts of a response.
+    """
+    raw = "|".join(str(part) for part in parts)
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+async def get_authorized_consultation(
+    consultation_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+) -> Consultation:
+    """
+    Fetch a consultation (appointment eager-loaded) and verify the caller
+    may access it. FastAPI caches the result per request, so handlers and
+    sub-dependencies share one SELECT and one membership check.
+    """
+    # Admins may access any consultation — skip the appointment join the
+    # membership check would need
+    if current_user.role == UserRole.ADMIN:
+        return await get_or_404(db, Consultation, consultation_id, "Consultation not found")
+
+    consultation = await get_or_404(
+        db, Consultation, consultation_id, "Consultation not found",
+        options=[joinedload(Consultation.appointment)],
+    )
+    appointment = consultation.appointment
+
+    is_patient = current_user.id == appointment.patient_id
+    is_doctor = current_user.id == appointment.doctor_id
+
+    if not (is_patient or is_doctor):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+
+    return consultation
+
 
 @router.post("/start/{appointment_id}", response_model=ConsultationSchema)
-def start_consultation(
+async def start_consultation(
     appointment_id: UUID,
     consultation_in: ConsultationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Start a new consultation for an appointment.
     """
-    # Get the appointment
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
-
-    if not appointment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Appointment not found",
-        )
+    # Get the appointment (identity-map aware PK lookup)
+    appointment = await get_or_404(db, Appointment, appointment_id, "Appointment not found")
 
     # Check if user is authorized to start consultation for this appointment
     is_patient = current_user.id == appointment.patient_id
@@ -57,12 +133,11 @@ def start_consultation(
             detail=f"Cannot start consultation for appointment with status '{appointment.status.value}'",
         )
 
-    # Check if consultation already exists
-    existing_consultation = db.query(Consultation).filter(
-        Consultation.appointment_id == appointment_id
-    ).first()
-
-    if existing_consultation:
+    # Check if consultation already exists — a boolean EXISTS probe, which
+    # with the unique appointment_id index is an index-only scan instead of
+    # materializing the full row
+    already_exists = await db.scalar(_CONSULTATION_EXISTS_STMT, {"aid": appointment_id})
+    if already_exists:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Consultation already exists for this appointment",
@@ -78,33 +153,42 @@ def start_consultation(
         started_at=datetime.utcnow(),
     )
     db.add(consultation)
-    db.commit()
-    db.refresh(consultation)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent start won the race past the EXISTS probe; the unique
+        # appointment_id index rejects the duplicate
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Consultation already exists for this appointment",
+        )
+    await db.refresh(consultation)
+
+    # Both participants' cached listings are now stale
+    await cache_clear_prefix(f"{CONSULTS_CACHE_PREFIX}{appointment.patient_id}:")
+    await cache_clear_prefix(f"{CONSULTS_CACHE_PREFIX}{appointment.doctor_id}:")
 
     return consultation
 
 
 @router.post("/{consultation_id}/end", response_model=ConsultationSchema)
-def end_consultation(
+async def end_consultation(
     consultation_id: UUID,
     consultation_in: ConsultationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_doctor),
 ) -> Any:
     """
     End a consultation and provide notes (doctor only).
     """
-    # Get the consultation
-    consultation = db.query(Consultation).filter(Consultation.id == consultation_id).first()
-
-    if not consultation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Consultation not found",
-        )
+    # Get the consultation with its appointment in one query
+    consultation = await get_or_404(
+        db, Consultation, consultation_id, "Consultation not found",
+        options=[joinedload(Consultation.appointment)],
+    )
 
-    # Get the associated appointment
-    appointment = db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
+    appointment = consultation.appointment
 
     if not appointment:
         raise HTTPException(
@@ -133,106 +217,128 @@ def end_consultation(
     # Update appointment status
     appointment.status = AppointmentStatus.COMPLETED
 
-    db.commit()
-    db.refresh(consultation)
+    await db.commit()
+    await db.refresh(consultation)
+
+    # Both participants' cached listings are now stale
+    await cache_clear_prefix(f"{CONSULTS_CACHE_PREFIX}{appointment.patient_id}:")
+    await cache_clear_prefix(f"{CONSULTS_CACHE_PREFIX}{appointment.doctor_id}:")
 
     return consultation
 
 
-@router.get("/me", response_model=List[ConsultationSchema])
-def get_my_consultations(
-    db: Session = Depends(get_db),
+@router.get("/me", response_model=ConsultationPage, response_model_exclude_none=True)
+async def get_my_consultations(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
+    limit: int = Query(50, le=200),
+    cursor: UUID = None,
 ) -> Any:
     """
-    Get current user's consultations.
+    Get current user's consultations, keyset-paginated.
+
+    Pages are cached briefly in Redis under a per-user key; the cache is
+    cleared for both participants when a consultation starts or ends.
     """
+    cache_key = f"{CONSULTS_CACHE_PREFIX}{current_user.id}:{limit}:{cursor or ''}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Select only the summary columns — no ORM hydration and no notes text
+    query = select(
+        Consultation.id,
+        Consultation.appointment_id,
+        Consultation.type,
+        Consultation.started_at,
+        Consultation.ended_at,
+        Consultation.created_at,
+    )
+
     if current_user.role == UserRole.PATIENT:
-        consultations = db.query(Consultation).join(
+        query = query.join(
             Appointment, Consultation.appointment_id == Appointment.id
-        ).filter(
-            Appointment.patient_id == current_user.id
-        ).all()
+        ).where(Appointment.patient_id == current_user.id)
     elif current_user.role == UserRole.DOCTOR:
-        consultations = db.query(Consultation).join(
+        query = query.join(
             Appointment, Consultation.appointment_id == Appointment.id
-        ).filter(
-            Appointment.doctor_id == current_user.id
-        ).all()
-    else:  # Admin can see all
-        consultations = db.query(Consultation).all()
+        ).where(Appointment.doctor_id == current_user.id)
+    # Admin can see all
+
+    # Keyset pagination: resume strictly after the cursor row instead of
+    # OFFSET-scanning past everything already served
+    if cursor:
+        cursor_row = await db.get(Consultation, cursor)
+        if cursor_row:
+            query = query.where(
+                tuple_(Consultation.created_at, Consultation.id)
+                > (cursor_row.created_at, cursor_row.id)
+            )
+
+    rows = (await db.execute(
+        query.order_by(Consultation.created_at, Consultation.id).limit(limit)
+    )).all()
+    next_cursor = rows[-1].id if len(rows) == limit else None
+
+    items = [
+        ConsultationSummary.model_construct(
+            id=row.id,
+            appointment_id=row.appointment_id,
+            type=row.type,
+            started_at=row.started_at,
+            ended_at=row.ended_at,
+        )
+        for row in rows
+    ]
 
-    return consultations
+    await cache_set(
+        cache_key,
+        {"items": [item.model_dump() for item in items], "next_cursor": next_cursor},
+        ttl=settings.CONSULTS_CACHE_TTL,
+    )
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.get("/{consultation_id}", response_model=ConsultationSchema)
-def get_consultation(
-    consultation_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+async def get_consultation(
+    request: Request,
+    response: Response,
+    consultation: Consultation = Depends(get_authorized_consultation),
 ) -> Any:
     """
     Get a consultation by ID.
-    """
-    consultation = db.query(Consultation).filter(Consultation.id == consultation_id).first()
-
-    if not consultation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Consultation not found",
-        )
-
-    # Get the associated appointment
-    appointment = db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
-
-    if not appointment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Associated appointment not found",
-        )
 
-    # Check if user is authorized to view this consultation
-    is_patient = current_user.id == appointment.patient_id
-    is_doctor = current_user.id == appointment.doctor_id
-    is_admin = current_user.role == UserRole.ADMIN
-
-    if not (is_patient or is_doctor or is_admin):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
+    Honors If-None-Match: repolling clients get a bodyless 304 while the
+    consultation is unchanged.
+    """
+    etag = _make_etag(consultation.id, consultation.updated_at)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
 
+    response.headers["ETag"] = etag
     return consultation
 
 
 @router.post("/{consultation_id}/message", response_model=MessageSchema)
-def create_message(
-    consultation_id: UUID,
+async def create_message(
     message_in: MessageCreate,
-    db: Session = Depends(get_db),
+    consultation: Consultation = Depends(get_authorized_consultation),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Send a message in a consultation.
     """
-    # Get the consultation
-    consultation = db.query(Consultation).filter(Consultation.id == consultation_id). personally
-    if not consultation:
+    # Only the participants may send messages — admins can read a
+    # consultation but not chat in it. Checked before touching the
+    # appointment: the admin path loads the consultation without it.
+    if current_user.role == UserRole.ADMIN:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Consultation not found",
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
         )
 
-    # Get the associated appointment
-    appointment = db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
+    appointment = consultation.appointment
 
-    if not appointment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Associated appointment not found",
-        )
-
-    # Check if user is authorized to send message in this consultation
     is_patient = current_user.id == appointment.patient_id
     is_doctor = current_user.id == appointment.doctor_id
 
@@ -249,60 +355,187 @@ def create_message(
             detail="Cannot send message to ended consultation",
         )
 
-    # Create new message
+    # Create new message. The id and timestamp are assigned here (the
+    # column defaults only fire at flush) so the response is complete, and
+    # the insert is handed to the write-behind buffer — one commit per
+    # batch instead of one fsync per message.
     message = Message(
-        consultation_id=consultation_id,
+        id=uuid.uuid4(),
+        consultation_id=consultation.id,
         sender_id=current_user.id,
         message=message_in.message,
+        timestamp=datetime.utcnow(),
     )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
+    message_buffer.enqueue(message)
 
     return message
 
 
-@router.get("/{consultation_id}/messages", response_model=List[MessageSchema])
-def get_consultation_messages(
-    consultation_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+@router.get("/{consultation_id}/messages", response_model=MessagePage)
+async def get_consultation_messages(
+    request: Request,
+    response: Response,
+    consultation: Consultation = Depends(get_authorized_consultation),
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(50, le=200),
+    cursor: UUID = None,
 ) -> Any:
     """
-    Get all messages in a consultation.
-    """
-    # Get the consultation
-    consultation = db.query(Consultation).filter(Consultation.id == consultation_id).first()
+    Get messages in a consultation, keyset-paginated in timestamp order.
 
-    if not consultation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Consultation not found",
-        )
-
-    # Get the associated appointment
-    appointment = db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
-
-    if not appointment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Associated appointment not found",
-        )
+    Honors If-None-Match: the ETag derives from max(timestamp) — an
+    index-only aggregate — so unchanged transcripts return 304 without
+    reading any message rows.
+    """
+    last_ts = await db.scalar(_LAST_MESSAGE_TS_STMT, {"cid": consultation.id})
+    etag = _make_etag(consultation.id, last_ts, limit, cursor)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers["ETag"] = etag
+
+    # Keyset pagination over (timestamp, id), served by the
+    # (consultation_id, timestamp) index
+    query = select(Message).where(Message.consultation_id == consultation.id)
+
+    if cursor:
+        cursor_row = await db.get(Message, cursor)
+        if cursor_row:
+            query = query.where(
+                tuple_(Message.timestamp, Message.id)
+                > (cursor_row.timestamp, cursor_row.id)
+            )
+
+    messages = (await db.execute(
+        query.order_by(Message.timestamp, Message.id).limit(limit)
+    )).scalars().all()
+    next_cursor = messages[-1].id if len(messages) == limit else None
+
+    return {"items": messages, "next_cursor": next_cursor}
+
+
+@router.websocket("/ws/{consultation_id}")
+async def chat_websocket(
+    websocket: WebSocket,
+    consultation_id: UUID,
+    token: str = Query(...),
+) -> Any:
+    """
+    WebSocket endpoint for a consultation chat.
 
-    # Check if user is authorized to view messages in this consultation
-    is_patient = current_user.id == appointment.patient_id
-    is_doctor = current_user.id == appointment.doctor_id
-    is_admin = current_user.role == UserRole.ADMIN
+    On connect, the full message history is replayed; afterwards incoming
+    frames are persisted and relayed to both participants.
 
-    if not (is_patient or is_doctor or is_admin):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
+    Sessions are scoped to individual queries rather than taken as a
+    dependency: a dependency-injected session stays checked out for the
+    whole connection, and long-lived chats would drain the pool even while
+    idle. This way thousands of sockets share the pool's few connections.
+    """
+    # Authenticate the connection from the token query parameter. The token
+    # claims carry the id, role, display name and active flag, so a current
+    # token needs no user SELECT on connect.
+    try:
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=[settings.ALGORITHM])
+        user_id = UUID(payload["sub"])
+    except (JWTError, KeyError, ValueError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    full_name = payload.get("name")
+    role = payload.get("role")
+
+    async with AsyncSessionLocal() as db:
+        if full_name is None or role is None:
+            # Token predates the extra claims — fall back to a user lookup
+            user = await db.scalar(_USER_BY_ID_STMT, {"uid": user_id})
+            if not user or not user.is_active:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            full_name, role = user.full_name, user.role.value
+        elif not payload.get("is_active"):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        consultation = await db.get(
+            Consultation, consultation_id,
+            options=[joinedload(Consultation.appointment)],
         )
-
-    # Get all messages in the consultation
-    messages = db.query(Message).filter(
-        Message.consultation_id == consultation_id
-    ).order_by(Message.timestamp).all()
-
-    return messages
\ No newline at end of file
+        if not consultation:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        # Only the two participants may join the chat
+        appointment = consultation.appointment
+        if user_id not in (appointment.patient_id, appointment.doctor_id):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        # Replay history with every sender preloaded in the same query —
+        # resolving sender names per message would be N+1 round-trips
+        messages = (await db.execute(
+            select(Message)
+            .options(joinedload(Message.sender))
+            .where(Message.consultation_id == consultation.id)
+            .order_by(Message.timestamp)
+        )).scalars().all()
+
+    connection_id = f"{role}_{user_id}"
+    await manager.connect(websocket, connection_id)
+
+    try:
+        # One frame for the whole history: a send per message would cost a
+        # frame build, a buffer drain and a context switch each. orjson
+        # serializes UUIDs and datetimes natively — no str()/isoformat()
+        # per field — and is several times faster than stdlib json.
+        await websocket.send_text(orjson.dumps({
+            "type": "history",
+            "messages": [
+                {
+                    "id": message.id,
+                    "sender_id": message.sender_id,
+                    "sender_name": message.sender.full_name,
+                    "message": message.message,
+                    "timestamp": message.timestamp,
+                }
+                for message in messages
+            ],
+        }).decode())
+
+        while True:
+            data = await websocket.receive_text()
+
+            if consultation.ended_at is not None:
+                break
+
+            # Assign the id and timestamp here (column defaults only fire
+            # at flush) and hand the row to the write-behind buffer — the
+            # same path the REST send uses. One batched commit replaces a
+            # round-trip plus fsync per incoming frame.
+            new_message = Message(
+                id=uuid.uuid4(),
+                consultation_id=consultation.id,
+                sender_id=user_id,
+                message=data,
+                timestamp=datetime.utcnow(),
+            )
+            message_buffer.enqueue(new_message)
+
+            message_json = orjson.dumps({
+                "type": "message",
+                "id": new_message.id,
+                "sender_id": new_message.sender_id,
+                "sender_name": full_name,
+                "message": new_message.message,
+                "timestamp": new_message.timestamp,
+            }).decode()
+
+            if user_id == appointment.doctor_id:
+                recipient_id = f"patient_{appointment.patient_id}"
+            else:
+                recipient_id = f"doctor_{appointment.doctor_id}"
+
+            # Synchronous enqueue — no Task allocation per message; each
+            # connection's writer coroutine drains its queue in order
+            manager.enqueue(message_json, recipient_id)
+            manager.enqueue(message_json, connection_id)
+    except WebSocketDisconnect:
+        manager.disconnect(connection_id, websocket)
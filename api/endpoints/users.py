@@ -1,9 +1,14 @@
 from typing import Any, List
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from core.auth import get_current_user, get_current_active_admin, get_current_active_doctor
-from database import get_db
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from config import settings
+from core.auth import get_current_user, get_current_active_admin, get_current_active_doctor, require_role
+from core.cache import cache_clear_prefix, cache_get, cache_set
+from database import get_async_db
 from models.user import User, Doctor, Patient, UserRole
 from schemas.user import (
     User as UserSchema,
@@ -16,6 +21,9 @@ from schemas.user import (
 
 router = APIRouter()
 
+# Prefix for cached doctor-roster pages; cleared whenever a doctor changes
+DOCTORS_CACHE_PREFIX = "klinika:doctors:"
+
 
 @router.get("/me", response_model=UserSchema)
 def get_user_me(current_user: User = Depends(get_current_user)) -> Any:
@@ -26,53 +34,84 @@ def get_user_me(current_user: User = Depends(get_current_user)) -> Any:
 
 
 @router.put("/me", response_model=UserSchema)
-def update_user_me(
+async def update_user_me(
         user_in: UserUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Update current user information.
     """
+    # current_user may be a detached instance from the token cache
+    current_user = await db.merge(current_user)
+
     # Update user attributes that are provided
-    for key, value in user_in.dict(exclude_unset=True).items():
+    for key, value in user_in.model_dump(exclude_unset=True).items():
         setattr(current_user, key, value)
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     return current_user
 
 
-@router.get("/doctors", response_model=List[DoctorInDB])
-def get_doctors(
-        db: Session = Depends(get_db),
-        skip: int = 0,
+@router.get("/doctors", response_model=List[DoctorInDB], response_model_exclude_none=True)
+async def get_doctors(
+        db: AsyncSession = Depends(get_async_db),
+        cursor: UUID = None,
         limit: int = 100,
 ) -> Any:
     """
-    Get list of all doctors.
+    Get list of all doctors, ordered by name.
+
+    Keyset-paginated: pass the id of the last doctor of the previous page
+    as the cursor — a btree seek that costs the same for every page,
+    where OFFSET would scan and discard all earlier rows. full_name is
+    nullable, so ordering and seeking go through coalesce.
+
+    The page is cached in Redis: every dashboard shows the roster, but it
+    only changes when a doctor is added or edits their profile.
     """
-    # Get all users with doctor role
-    doctors = (
-        db.query(Doctor)
+    cache_key = f"{DOCTORS_CACHE_PREFIX}{cursor or ''}:{limit}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Get all users with doctor role; the user row is eager-loaded because
+    # the response schema serializes it (lazy loads are not possible here)
+    sort_name = func.coalesce(User.full_name, "")
+    query = (
+        select(Doctor)
         .join(User)
-        .filter(User.role == UserRole.DOCTOR, User.is_active == True)
-        .offset(skip)
-        .limit(limit)
-        .all()
+        .options(joinedload(Doctor.user))
+        .where(User.role == UserRole.DOCTOR, User.is_active == True)
+    )
+    if cursor is not None:
+        cursor_name = await db.scalar(
+            select(func.coalesce(User.full_name, "")).where(User.id == cursor)
+        )
+        if cursor_name is not None:
+            query = query.where(tuple_(sort_name, Doctor.id) > (cursor_name, cursor))
+    doctors = (await db.execute(
+        query.order_by(sort_name, Doctor.id).limit(limit)
+    )).scalars().all()
+
+    await cache_set(
+        cache_key,
+        [DoctorInDB.model_validate(doctor).model_dump() for doctor in doctors],
+        ttl=settings.DOCTORS_CACHE_TTL,
     )
     return doctors
 
 
 @router.get("/doctor/{doctor_id}", response_model=DoctorInDB)
-def get_doctor(
+async def get_doctor(
         doctor_id: str,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ) -> Any:
     """
     Get doctor by ID.
     """
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+    doctor = await db.get(Doctor, doctor_id, options=[joinedload(Doctor.user)])
     if not doctor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -82,15 +121,15 @@ def get_doctor(
 
 
 @router.put("/doctor/me", response_model=DoctorInDB)
-def update_doctor_me(
+async def update_doctor_me(
         doctor_in: DoctorUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_doctor),
 ) -> Any:
     """
     Update current doctor information.
     """
-    doctor = db.query(Doctor).filter(Doctor.id == current_user.id).first()
+    doctor = await db.get(Doctor, current_user.id, options=[joinedload(Doctor.user)])
     if not doctor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -98,30 +137,27 @@ def update_doctor_me(
         )
 
     # Update doctor attributes that are provided
-    for key, value in doctor_in.dict(exclude_unset=True).items():
+    for key, value in doctor_in.model_dump(exclude_unset=True).items():
         setattr(doctor, key, value)
 
-    db.commit()
-    db.refresh(doctor)
+    await db.commit()
+    await db.refresh(doctor)
+
+    # The cached roster pages now show stale profile data
+    await cache_clear_prefix(DOCTORS_CACHE_PREFIX)
     return doctor
 
 
 @router.put("/patient/me", response_model=PatientInDB)
-def update_patient_me(
+async def update_patient_me(
         patient_in: PatientUpdate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: User = Depends(require_role(UserRole.PATIENT)),
 ) -> Any:
     """
     Update current patient information.
     """
-    if current_user.role != UserRole.PATIENT:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
-
-    patient = db.query(Patient).filter(Patient.id == current_user.id).first()
+    patient = await db.get(Patient, current_user.id, options=[joinedload(Patient.user)])
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -129,27 +165,27 @@ def update_patient_me(
         )
 
     # Update patient attributes that are provided
-    for key, value in patient_in.dict(exclude_unset=True).items():
+    for key, value in patient_in.model_dump(exclude_unset=True).items():
         setattr(patient, key, value)
 
-    db.commit()
-    db.refresh(patient)
+    await db.commit()
+    await db.refresh(patient)
     return patient
 
 
 @router.get("/{user_id}", response_model=UserSchema)
-def get_user_by_id(
+async def get_user_by_id(
         user_id: str,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         current_user: User = Depends(get_current_active_admin),
 ) -> Any:
     """
     Get user by ID. Admin only.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    return user
\ No newline at end of file
+    return user
@@ -1,12 +1,25 @@
 import os
+from functools import lru_cache
+
 from decouple import config
-from pydantic import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env file
 
+# Ma'lumotlar Bazasi Konfiguratsiyasi — resolved before the settings class
+# (Pydantic v2 requires every class-body assignment to be a typed field)
+_raw_db_url = config('DATABASE_URL')
+
+# Handle the case where DATABASE_URL might be a template string like ${db.DATABASE_URL}
+if _raw_db_url.startswith('${') and _raw_db_url.endswith('}'):
+    # If in Digital Ocean, use the default PostgreSQL connection string
+    _raw_db_url = "your_database_url"
+
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(case_sensitive=True)
+
     PROJECT_NAME: str = "Xususiy Klinika Platformasi"
     PROJECT_VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
@@ -16,22 +29,28 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
     ALGORITHM: str = "HS256"
 
+    DATABASE_URL: str = _raw_db_url
 
-    # Ma'lumotlar Bazasi Konfiguratsiyasi
-    raw_db_url = config('DATABASE_URL')
-
-    # Handle the case where DATABASE_URL might be a template string like ${db.DATABASE_URL}
-    if raw_db_url.startswith('${') and raw_db_url.endswith('}'):
-        # If in Digital Ocean, use the default PostgreSQL connection string
-        DATABASE_URL = "your_database_url"
+    # Set when DATABASE_URL points at PgBouncer in transaction-pooling
+    # mode (pool_mode=transaction): server-side prepared statements don't
+    # survive across pooled transactions, so the drivers must not cache them
+    PGBOUNCER_MODE: bool = os.getenv("PGBOUNCER_MODE", "false").lower() in ("1", "true", "yes")
 
-    else:
-        DATABASE_URL = raw_db_url
+    # Redis Konfiguratsiyasi (response caching)
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    STATS_CACHE_TTL: int = 30  # seconds
+    DOCTORS_CACHE_TTL: int = 300  # seconds; the doctor roster changes rarely
+    CONSULTS_CACHE_TTL: int = 30  # seconds; per-user consultation listings
 
-"
 
-    class Config:
-        case_sensitive = True
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Build the Settings object exactly once. Instantiation re-reads the
+    environment, so anything that needs settings lazily (tests, scripts)
+    should go through here rather than constructing its own copy.
+    """
+    return Settings()
 
 
-settings = Settings()
+settings = get_settings()
@@ -1,22 +1,36 @@
+import time
 from datetime import datetime
 
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+import jwt
+from jwt import InvalidTokenError as JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
-from database import get_db
+from core.security import SIGNING_KEY
+from database import get_async_db
 from models.user import User, UserRole
 from schemas.user import TokenPayload
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/token")
 
+# Bound once — skips the module attribute lookup on the per-request path
+_decode = jwt.decode
+
+# Short-lived cache of raw token -> (user, exp). A hit skips both the HMAC
+# signature check and the user SELECT; the TTL bounds how long a revoked or
+# deactivated account can keep authenticating. Cached users are detached —
+# endpoints that mutate them must merge them into their own session.
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
 
 # Dependency to get current user from token
 async def get_current_user(
-        db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+        db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
 ) -> User:
     """
     Get the current user from the token.
@@ -27,9 +41,16 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    cached = _token_cache.get(token)
+    if cached is not None:
+        user, exp = cached
+        if exp > time.time() and user.is_active:
+            return user
+        _token_cache.pop(token, None)
+
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        payload = _decode(
+            token, SIGNING_KEY, algorithms=[settings.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
 
@@ -41,48 +62,40 @@ async def get_current_user(
         raise credentials_exception
 
     # Get user from database
-    user = db.query(User).filter(User.id == token_data.sub).first()
+    result = await db.execute(select(User).where(User.id == token_data.sub))
+    user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
 
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
+    _token_cache[token] = (user, token_data.exp)
+
     return user
 
 
-# Role-based access control dependencies
-def get_current_active_patient(current_user: User = Depends(get_current_user)) -> User:
-    """
-    Get the current patient user.
-    """
-    if current_user.role != UserRole.PATIENT:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
-    return current_user
+# Shared 403 — HTTPException is immutable for our purposes, so one instance
+# serves every rejection instead of allocating per check
+_FORBIDDEN = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Not enough permissions",
+)
 
 
-def get_current_active_doctor(current_user: User = Depends(get_current_user)) -> User:
+def require_role(*roles: UserRole):
     """
-    Get the current doctor user.
+    Build a dependency that admits only users with one of the given roles.
     """
-    if current_user.role != UserRole.DOCTOR:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
-    return current_user
+    def dependency(current_user: User = Depends(get_current_user)) -> User:
+        if current_user.role not in roles:
+            raise _FORBIDDEN
+        return current_user
 
+    return dependency
 
-def get_current_active_admin(current_user: User = Depends(get_current_user)) -> User:
-    """
-    Get the current admin user.
-    """
-    if current_user.role != UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
-        )
-    return current_user
\ No newline at end of file
+
+# Role-based access control dependencies
+get_current_active_patient = require_role(UserRole.PATIENT)
+get_current_active_doctor = require_role(UserRole.DOCTOR)
+get_current_active_admin = require_role(UserRole.ADMIN)
\ No newline at end of file
@@ -0,0 +1,49 @@
+import orjson
+from redis import asyncio as aioredis
+
+from config import settings
+
+# Shared Redis client for response caching.
+# Connections are established lazily on first use, so importing this module
+# is safe even when Redis is not running (callers must handle errors).
+redis = aioredis.from_url(
+    settings.REDIS_URL,
+    encoding="utf-8",
+    decode_responses=True,
+)
+
+
+async def cache_get(key: str):
+    """
+    Fetch a cached JSON payload. Returns None on a miss or if Redis is down —
+    callers fall through to the database either way.
+    """
+    try:
+        cached = await redis.get(key)
+    except Exception:
+        return None
+    return orjson.loads(cached) if cached else None
+
+
+async def cache_set(key: str, payload, ttl: int) -> None:
+    """
+    Store a JSON-serializable payload under a TTL. Redis being down must not
+    break the request, so errors are swallowed.
+    """
+    try:
+        # orjson serializes UUIDs and datetimes natively and emits bytes,
+        # which go to Redis as-is; default=str covers anything else
+        await redis.set(key, orjson.dumps(payload, default=str), ex=ttl)
+    except Exception:
+        pass
+
+
+async def cache_clear_prefix(prefix: str) -> None:
+    """
+    Best-effort invalidation of every cached key under a prefix.
+    """
+    try:
+        async for key in redis.scan_iter(match=prefix + "*"):
+            await redis.delete(key)
+    except Exception:
+        pass
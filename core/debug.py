@@ -0,0 +1,40 @@
+import contextvars
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request query counter. The ContextVar holds a mutable one-element
+# list rather than an int: Starlette runs the endpoint in a child task,
+# and a plain .set() there would land in a copied context the middleware
+# never sees. Mutating the shared list works across that boundary, and
+# concurrent requests still get independent holders without any locking.
+_query_count: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "query_count", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    holder = _query_count.get()
+    if holder is not None:
+        holder[0] += 1
+
+
+async def query_count_middleware(request, call_next):
+    """
+    Stamp every response with an X-Query-Count header.
+
+    The header makes N+1 regressions visible in logs and lets an HTTP test
+    assert an upper bound on the number of statements a route may issue.
+    The counter itself is one list increment per statement — cheap enough
+    to leave on in production.
+    """
+    holder = [0]
+    token = _query_count.set(holder)
+    try:
+        response = await call_next(request)
+    finally:
+        _query_count.reset(token)
+    response.headers["X-Query-Count"] = str(holder[0])
+    return response
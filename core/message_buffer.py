@@ -0,0 +1,116 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from database import SessionLocal
+
+# Flush cadence: a batch is committed when it reaches _MAX_BATCH rows or
+# when _FLUSH_INTERVAL has elapsed since its first message, whichever
+# comes first. This bounds the durability window while amortizing one
+# WAL fsync across the whole batch.
+_FLUSH_INTERVAL = 0.05  # seconds
+_MAX_BATCH = 500
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    Endpoints enqueue fully-populated Message instances and return
+    immediately; a single daemon thread drains the queue and batch-inserts
+    the rows in one transaction, so a keystroke burst costs one commit
+    instead of one per message.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("message_buffer")
+
+    def enqueue(self, message):
+        """
+        Queue a message for insertion. The instance must carry its id and
+        timestamp already (the column defaults only fire at flush time).
+        """
+        self._ensure_started()
+        self._queue.put(message)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="message-flusher", daemon=True
+            )
+            self._thread.start()
+            # The flusher is a daemon thread, so without a drain hook a
+            # graceful restart would silently drop anything still queued —
+            # rows already acknowledged to clients. The app's shutdown
+            # event also drains; atexit covers non-ASGI exits.
+            atexit.register(self.drain)
+
+    def _run(self):
+        while True:
+            # Block for the first message, then gather the rest of the
+            # batch for at most the flush interval
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + _FLUSH_INTERVAL
+            while len(batch) < _MAX_BATCH:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def drain(self):
+        """
+        Synchronously flush everything still queued. Called from the app
+        shutdown hook (and atexit) so a restart cannot drop messages that
+        were already acknowledged to clients.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= _MAX_BATCH:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        db = SessionLocal()
+        try:
+            try:
+                db.add_all(batch)
+                db.commit()
+            except Exception:
+                # One bad row must not destroy the whole batch: roll back
+                # and replay each message on its own, dropping (and
+                # logging) only the rows that genuinely fail
+                db.rollback()
+                for message in batch:
+                    try:
+                        db.add(message)
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        self.logger.error(
+                            f"Dropping message {message.id}: {e}"
+                        )
+        finally:
+            db.close()
+
+
+# Shared buffer instance
+message_buffer = MessageBuffer()
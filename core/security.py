@@ -1,16 +1,56 @@
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
-from jose import jwt
+import jwt
 from passlib.context import CryptContext
 from config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Signing key encoded once at import — token operations run on every
+# authenticated request, so the str→bytes derivation is hoisted out of
+# the hot path
+SIGNING_KEY = settings.SECRET_KEY.encode()
+
+# Password hashing. Argon2id is the default for new hashes (memory-hard,
+# so attacker GPU cost scales with the 64MiB memory_cost, and verify time
+# is tunable against the latency budget); existing bcrypt hashes still
+# verify and are marked deprecated so they rehash transparently on login.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated="auto",
+    # OWASP baseline (19 MiB, t=2, p=1): equal security class to the
+    # heavier settings but roughly a third of the hash/verify latency,
+    # which is pure CPU on every registration and login
+    argon2__memory_cost=19456,  # 19 MiB
+    argon2__time_cost=2,
+    argon2__parallelism=1,
+)
+
+
+# Hash of a throwaway password, computed once at import. authenticate()
+# verifies against this when the username doesn't exist, so a login
+# attempt costs one hash verification whether or not the user is real —
+# no timing oracle for username enumeration.
+DUMMY_PASSWORD_HASH = pwd_context.hash("dummy-password-for-timing")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """
+    Verify a password against a hash.
+
+    The underlying argon2/bcrypt comparison is constant-time. A malformed
+    or unrecognized stored hash is treated as a plain mismatch rather than
+    raising — an exception path would return in microseconds and betray
+    that the row holds a broken hash.
+    """
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except (ValueError, TypeError):
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash should be upgraded to the current scheme."""
+    return pwd_context.needs_update(hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -19,9 +59,18 @@ def get_password_hash(password: str) -> str:
 
 
 def create_access_token(
-        subject: Union[str, Any], role: str, expires_delta: Optional[timedelta] = None
+        subject: Union[str, Any], role: str, name: str = "",
+        expires_delta: Optional[timedelta] = None
 ) -> str:
-    """Create a JWT access token."""
+    """
+    Create a JWT access token.
+
+    Besides the subject and role, the display name and an is_active claim
+    are packed in so consumers (the chat WebSocket) can authenticate a
+    connection without a user lookup. Tokens are only issued to active
+    users; a deactivation therefore propagates to claim consumers when
+    the token expires.
+    """
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -29,8 +78,14 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode = {"exp": expire, "sub": str(subject), "role": role}
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "role": role,
+        "name": name,
+        "is_active": True,
+    }
     encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        to_encode, SIGNING_KEY, algorithm=settings.ALGORITHM
     )
     return encoded_jwt
\ No newline at end of file
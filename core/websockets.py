@@ -1,61 +1,221 @@
-# from fastapi import WebSocket
-# from typing import Dict, List
-# import logging
-#
-#
-# class ConnectionManager:
-#     def __init__(self):
-#         # Map user_id to WebSocket connection
-#         self.active_connections: Dict[str, WebSocket] = {}
-#         self.logger = logging.getLogger("websockets")
-#
-#     async def connect(self, websocket: WebSocket, user_id: str):
-#         """
-#         Connect a new WebSocket client.
-#         """
-#         await websocket.accept()
-#         # If user already has an active connection, close it
-#         if user_id in self.active_connections:
-#             try:
-#                 await self.active_connections[user_id].close()
-#             except Exception as e:
-#                 self.logger.error(f"Error closing existing connection: {e}")
-#
-#         self.active_connections[user_id] = websocket
-#         self.logger.info(f"User {user_id} connected. Total active connections: {len(self.active_connections)}")
-#
-#     def disconnect(self, user_id: str):
-#         """
-#         Disconnect a WebSocket client.
-#         """
-#         if user_id in self.active_connections:
-#             del self.active_connections[user_id]
-#             self.logger.info(f"User {user_id} disconnected. Total active connections: {len(self.active_connections)}")
-#
-#     async def send_personal_message(self, message: str, user_id: str):
-#         """
-#         Send a message to a specific user.
-#         """
-#         if user_id in self.active_connections:
-#             try:
-#                 await self.active_connections[user_id].send_text(message)
-#             except Exception as e:
-#                 self.logger.error(f"Error sending message to {user_id}: {e}")
-#                 # Connection might be broken, remove it
-#                 self.disconnect(user_id)
-#
-#     async def broadcast(self, message: str):
-#         """
-#         Broadcast a message to all connected clients.
-#         """
-#         disconnected_users = []
-#         for user_id, connection in self.active_connections.items():
-#             try:
-#                 await connection.send_text(message)
-#             except Exception as e:
-#                 self.logger.error(f"Error broadcasting to {user_id}: {e}")
-#                 disconnected_users.append(user_id)
-#
-#         # Clean up any broken connections
-#         for user_id in disconnected_users:
-#             self.disconnect(user_id)
\ No newline at end of file
+import asyncio
+from fastapi import WebSocket
+from typing import Dict, List
+import logging
+
+import orjson
+
+
+class ConnectionManager:
+    """
+    Tracks connections in parallel arrays (struct-of-arrays) rather than a
+    single dict of records: the broadcast hot loop walks one contiguous
+    list of queues with no per-entry hashing or key iteration, while the
+    side index keeps connect/disconnect at O(1) via swap-pop.
+    """
+
+    def __init__(self):
+        # Parallel per-connection arrays; slot i describes one connection
+        self._user_ids: List[str] = []
+        self._sockets: List[WebSocket] = []
+        # Per-connection outbound queue and its writer coroutine: sends are
+        # enqueued synchronously (no Task allocation per message) and a
+        # single writer per socket drains the queue in order
+        self._queues: List[asyncio.Queue] = []
+        self._writers: List[asyncio.Task] = []
+        # user_id -> slot, used only for point lookups and removal
+        self._index: Dict[str, int] = {}
+        # Small updates awaiting coalescing into one frame per user
+        self._pending: Dict[str, List[dict]] = {}
+        self._flush_task: asyncio.Task = None
+        self.logger = logging.getLogger("websockets")
+
+    def __len__(self) -> int:
+        return len(self._sockets)
+
+    async def connect(self, websocket: WebSocket, user_id: str):
+        """
+        Connect a new WebSocket client.
+        """
+        await websocket.accept()
+        # If user already has an active connection, close it
+        slot = self._index.get(user_id)
+        if slot is not None:
+            old_socket = self._sockets[slot]
+            try:
+                await old_socket.close()
+            except Exception as e:
+                self.logger.error(f"Error closing existing connection: {e}")
+            # The displaced handler may have woken and disconnected during
+            # the await; only tear the slot down if the old socket still
+            # owns it
+            slot = self._index.get(user_id)
+            if slot is not None and self._sockets[slot] is old_socket:
+                self._remove(user_id)
+
+        self._index[user_id] = len(self._sockets)
+        self._user_ids.append(user_id)
+        self._sockets.append(websocket)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._queues.append(queue)
+        self._writers.append(
+            asyncio.create_task(self._writer(user_id, websocket, queue))
+        )
+        self.logger.info(f"User {user_id} connected. Total active connections: {len(self)}")
+
+    def disconnect(self, user_id: str, websocket: WebSocket = None):
+        """
+        Disconnect a WebSocket client.
+
+        Removal is identity-aware: when the caller passes its websocket,
+        the slot is only torn down if that socket still owns it. Without
+        this, the handler of a connection displaced by a reconnect would
+        wake with WebSocketDisconnect and remove the *new* connection
+        registered under the same user_id.
+        """
+        slot = self._index.get(user_id)
+        if slot is None:
+            return
+        if websocket is not None and self._sockets[slot] is not websocket:
+            return
+        self._remove(user_id)
+        self._pending.pop(user_id, None)
+        self.logger.info(f"User {user_id} disconnected. Total active connections: {len(self)}")
+
+    def _remove(self, user_id: str):
+        """
+        Drop a connection's slot: cancel its writer, then swap-pop the tail
+        entry into the vacated slot so the arrays stay dense.
+        """
+        slot = self._index.pop(user_id)
+        writer = self._writers[slot]
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+        last = len(self._sockets) - 1
+        if slot != last:
+            self._user_ids[slot] = self._user_ids[last]
+            self._sockets[slot] = self._sockets[last]
+            self._queues[slot] = self._queues[last]
+            self._writers[slot] = self._writers[last]
+            self._index[self._user_ids[slot]] = slot
+        self._user_ids.pop()
+        self._sockets.pop()
+        self._queues.pop()
+        self._writers.pop()
+
+    def enqueue(self, message, user_id: str):
+        """
+        Queue a message for a specific user without allocating a Task.
+        Drops the message if the user is not connected or their queue is
+        full (a stalled reader must not block the sender).
+        """
+        slot = self._index.get(user_id)
+        if slot is None:
+            return
+        try:
+            self._queues[slot].put_nowait(message)
+        except asyncio.QueueFull:
+            self.logger.error(f"Outbound queue full for {user_id}, dropping message")
+
+    def queue_update(self, update: dict, user_id: str):
+        """
+        Coalesce a small update into the user's pending batch.
+
+        Each WebSocket frame carries fixed protocol overhead that rivals a
+        ~50-byte JSON payload, so bursts of tiny updates (queue positions,
+        snapshots) are accumulated for up to 50ms and flushed as a single
+        JSON-array frame per user.
+        """
+        self._pending.setdefault(user_id, []).append(update)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after(0.05))
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        pending, self._pending = self._pending, {}
+        for user_id, updates in pending.items():
+            # One serialization and one frame per user, however many
+            # updates accumulated
+            self.enqueue(orjson.dumps(updates).decode(), user_id)
+
+    async def _writer(self, user_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        Drain one connection's outbound queue onto its socket.
+        """
+        try:
+            while True:
+                message = await queue.get()
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error sending message to {user_id}: {e}")
+            self.disconnect(user_id, websocket)
+
+    async def send_personal_message(self, message: str, user_id: str):
+        """
+        Send a message to a specific user via their outbound queue.
+        """
+        self.enqueue(message, user_id)
+
+    async def broadcast_many(self, message: str, user_ids: List[str]):
+        """
+        Send the same message to several users.
+        """
+        for user_id in user_ids:
+            self.enqueue(message, user_id)
+
+    # Connections enqueued per event-loop slice during a broadcast; between
+    # slices the loop runs other ready tasks (accepts, HTTP handlers, the
+    # writers themselves), bounding the stall however many clients connect
+    _BROADCAST_CHUNK = 500
+
+    async def broadcast(self, message: str):
+        """
+        Broadcast a message to all connected clients.
+
+        Every connection has a dedicated writer draining its own queue, so
+        a broadcast is one non-blocking put per user: framing and socket
+        writes happen off the caller's path, and a slow client can only
+        fall behind on its own queue — never block anyone else. Broken
+        connections are reaped by their writer when the send fails.
+        """
+        await self._broadcast_payload(message)
+
+    async def broadcast_bytes(self, payload: bytes):
+        """
+        Broadcast a pre-serialized binary payload to all connected clients.
+
+        Callers serialize (and optionally compress) exactly once; every
+        writer sends the same bytes object as a binary frame, so nothing
+        is re-encoded per connection.
+        """
+        await self._broadcast_payload(payload)
+
+    async def _broadcast_payload(self, payload):
+        # Snapshot the dense queue array — the hot loop walks a contiguous
+        # list, with no dict iteration and no per-user hash lookup
+        queues = list(self._queues)
+        if len(queues) <= self._BROADCAST_CHUNK:
+            for queue in queues:
+                self._put(queue, payload)
+            return
+
+        for start in range(0, len(queues), self._BROADCAST_CHUNK):
+            for queue in queues[start:start + self._BROADCAST_CHUNK]:
+                self._put(queue, payload)
+            await asyncio.sleep(0)
+
+    def _put(self, queue: asyncio.Queue, payload):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.logger.error("Outbound queue full during broadcast, dropping message")
+
+
+# Shared connection manager instance
+manager = ConnectionManager()
@@ -1,13 +1,67 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from config import settings
 
-# Create SQLAlchemy engine
-engine = create_engine(settings.DATABASE_URL)
+# Create SQLAlchemy engine (sync; its only remaining consumer is the
+# message buffer's flusher thread). Explicit pool sizing keeps sustained
+# concurrency on reused connections instead of renegotiating TCP+TLS per
+# request, and pre_ping/recycle evict stale connections before a request
+# trips over them.
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_size=20,
+    max_overflow=20,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
 
-# Create SessionLocal class for database sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine over asyncpg so endpoints await DB I/O on the event loop
+# instead of occupying a threadpool worker per request
+if settings.DATABASE_URL.startswith("postgres://"):
+    ASYNC_DATABASE_URL = settings.DATABASE_URL.replace(
+        "postgres://", "postgresql+asyncpg://", 1
+    )
+else:
+    ASYNC_DATABASE_URL = settings.DATABASE_URL.replace(
+        "postgresql://", "postgresql+asyncpg://", 1
+    )
+# Behind PgBouncer in transaction mode, asyncpg's automatic prepared-
+# statement cache must be disabled — a statement prepared on one pooled
+# backend is not guaranteed to exist on the next
+_async_connect_args = (
+    {"statement_cache_size": 0} if settings.PGBOUNCER_MODE else {}
+)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=20,
+    max_overflow=20,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    connect_args=_async_connect_args,
+)
+
+# Create SessionLocal classes for database sessions. The sync factory is
+# thread-scoped: each worker thread reuses its own session object instead
+# of constructing a fresh one per checkout. expire_on_commit=False keeps
+# attributes readable after commit without a refresh SELECT — every
+# default in the models is client-side, so the in-memory state already
+# matches what was written.
+SessionLocal = scoped_session(
+    sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+    )
+)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 # Create Base class for models
 Base = declarative_base()
@@ -18,4 +72,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        # Closes the session and clears the thread-local registry slot
+        SessionLocal.remove()
+
+
+# Dependency for getting an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
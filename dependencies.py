@@ -1,20 +1,40 @@
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from core.auth import (
     get_current_user
 )
 from models.user import User
 
 
-def get_user_from_path(
+async def get_or_404(db, model, pk, detail, options=None):
+    """
+    Fetch a row by primary key or raise a 404 with the given detail.
+    """
+    obj = await db.get(model, pk, options=options)
+    if not obj:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=detail,
+        )
+    return obj
+
+
+async def get_user_from_path(
         user_id: str,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: User = Depends(get_current_user),
 ) -> User:
     """
     Get a user by ID from the path parameter.
+
+    When the path id is the caller's own, the already-resolved user is
+    returned without a second SELECT — the common case for /users/{id}
+    style routes.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    if user_id == str(current_user.id):
+        return current_user
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -41,4 +61,4 @@ def check_user_permission(
     raise HTTPException(
         status_code=status.HTTP_403_FORBIDDEN,
         detail="Not enough permissions",
-    )
\ No newline at end of file
+    )
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
@@ -16,11 +16,29 @@ class AppointmentStatus(str, PyEnum):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Covers the booking conflict check and doctor schedule queries
+        Index("ix_appt_doctor_time_status", "doctor_id", "scheduled_time", "status"),
+        # Covers patient appointment listings ordered by scheduled_time
+        Index("ix_appt_patient_time", "patient_id", "scheduled_time"),
+        # The database enforces "one active appointment per doctor per slot",
+        # closing the check-then-insert race in create_appointment
+        Index(
+            "ux_appt_doctor_time_active",
+            "doctor_id",
+            "scheduled_time",
+            unique=True,
+            postgresql_where=text("status IN ('WAITING', 'IN_PROGRESS')"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     patient_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    status = Column(Enum(AppointmentStatus), default=AppointmentStatus.WAITING)
+    # native_enum=False stores the value as VARCHAR + CHECK instead of a
+    # Postgres enum type (see models/user.py); status equality filters then
+    # compare plain strings and new members need no ALTER TYPE
+    status = Column(Enum(AppointmentStatus, native_enum=False, length=16), default=AppointmentStatus.WAITING)
     scheduled_time = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
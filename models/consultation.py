@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Text
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
@@ -14,10 +14,16 @@ class ConsultationType(str, PyEnum):
 
 class Consultation(Base):
     __tablename__ = "consultations"
+    __table_args__ = (
+        # One consultation per appointment, enforced by the database; also
+        # turns the start_consultation existence probe into an index-only scan
+        Index("ux_consultation_appointment", "appointment_id", unique=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id"), nullable=False)
-    type = Column(Enum(ConsultationType), nullable=False)
+    # VARCHAR + CHECK rather than a Postgres enum type (see models/user.py)
+    type = Column(Enum(ConsultationType, native_enum=False, length=16), nullable=False)
     started_at = Column(DateTime, nullable=True)
     ended_at = Column(DateTime, nullable=True)
     notes = Column(Text, nullable=True)
@@ -31,6 +37,11 @@ class Consultation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves "WHERE consultation_id = ? ORDER BY timestamp" as an index
+        # range scan with no in-memory sort
+        Index("ix_message_consult_ts", "consultation_id", "timestamp"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     consultation_id = Column(UUID(as_uuid=True), ForeignKey("consultations.id"), nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
@@ -21,11 +21,21 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     full_name = Column(String)
     password_hash = Column(String, nullable=False)
-    role = Column(Enum(UserRole), nullable=False)
+    # native_enum=False stores the value as VARCHAR + CHECK instead of a
+    # Postgres enum type: no custom-type OID resolution per connection and
+    # no ALTER TYPE ceremony when the member set changes
+    role = Column(Enum(UserRole, native_enum=False, length=16), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Emails are normalized to lowercase on write (UserService), but the
+    # expression index makes the database enforce that Foo@x and foo@x can
+    # never coexist even for rows written by other paths
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+    )
+
     # Relationships
     doctor_appointments = relationship("Appointment", foreign_keys="Appointment.doctor_id", back_populates="doctor")
     patient_appointments = relationship("Appointment", foreign_keys="Appointment.patient_id", back_populates="patient")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import Optional
 from uuid import UUID
 from datetime import datetime
@@ -13,7 +13,8 @@ class AppointmentBase(BaseModel):
 
 # Schema for creating an appointment
 class AppointmentCreate(AppointmentBase):
-    @validator('scheduled_time')
+    @field_validator('scheduled_time')
+    @classmethod
     def scheduled_time_must_be_future(cls, v):
         if v < datetime.utcnow():
             raise ValueError('Scheduled time must be in the future')
@@ -34,8 +35,7 @@ class AppointmentInDB(AppointmentBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Schema for appointment output
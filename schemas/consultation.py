@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 from models.consultation import ConsultationType
@@ -30,8 +30,7 @@ class ConsultationInDB(ConsultationBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Schema for consultation output
@@ -56,10 +55,33 @@ class MessageInDB(MessageBase):
     sender_id: UUID
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Schema for message output
 class Message(MessageInDB):
-    pass
\ No newline at end of file
+    pass
+
+
+# Summary row for list views — omits notes and audit timestamps so the
+# listing moves narrow rows out of the database
+class ConsultationSummary(BaseModel):
+    id: UUID
+    appointment_id: UUID
+    type: ConsultationType
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Keyset-paginated pages; next_cursor is the id of the last item, or None
+# when the listing is exhausted
+class ConsultationPage(BaseModel):
+    items: List[ConsultationSummary]
+    next_cursor: Optional[UUID] = None
+
+
+class MessagePage(BaseModel):
+    items: List[Message]
+    next_cursor: Optional[UUID] = None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
 from typing import Optional
 from uuid import UUID
 from datetime import datetime
@@ -17,7 +17,8 @@ class UserCreate(UserBase):
     password: str
     role: UserRole
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def password_min_length(cls, v):
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters long')
@@ -38,8 +39,7 @@ class UserInDB(UserBase):
     updated_at: datetime
     is_active: bool
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Schema for user output (hiding sensitive info)
@@ -66,8 +66,7 @@ class DoctorInDB(DoctorBase):
     id: UUID
     user: User
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Patient specific schemas
@@ -89,8 +88,7 @@ class PatientInDB(PatientBase):
     id: UUID
     user: User
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Token schemas
@@ -1,7 +1,8 @@
 from typing import Optional, List, Dict, Any
 from uuid import UUID
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 
@@ -10,16 +11,16 @@ from models.appointment import Appointment, AppointmentStatus
 
 
 class AppointmentService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_by_id(self, appointment_id: UUID) -> Optional[Appointment]:
+    async def get_by_id(self, appointment_id: UUID) -> Optional[Appointment]:
         """
         Get appointment by ID.
         """
-        return self.db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        return await self.db.get(Appointment, appointment_id)
 
-    def check_doctor_availability(self, doctor_id: UUID, scheduled_time: datetime) -> bool:
+    async def check_doctor_availability(self, doctor_id: UUID, scheduled_time: datetime) -> bool:
         """
         Check if doctor is available at the specified time.
         """
@@ -29,56 +30,96 @@ class AppointmentService:
         end_time = scheduled_time + time_window
 
         # Check for existing appointments in the time window
-        existing_appointment = self.db.query(Appointment).filter(
-            Appointment.doctor_id == doctor_id,
-            Appointment.scheduled_time.between(start_time, end_time),
-            Appointment.status.in_([AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS])
-        ).first()
+        existing_appointment = (await self.db.execute(
+            select(Appointment.id).where(
+                Appointment.doctor_id == doctor_id,
+                Appointment.scheduled_time.between(start_time, end_time),
+                Appointment.status.in_([AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS])
+            ).limit(1)
+        )).first()
 
         return existing_appointment is None
 
-    def create_appointment(
+    async def create_appointment(
             self, patient_id: UUID, doctor_id: UUID, scheduled_time: datetime
     ) -> Appointment:
         """
         Create a new appointment.
         """
-        # Check if doctor exists
-        doctor = self.db.query(User).filter(
-            User.id == doctor_id,
-            User.role == UserRole.DOCTOR,
-            User.is_active == True
-        ).first()
-        if not doctor:
+        # Doctor existence and availability in a single round-trip: two
+        # EXISTS subqueries answered by one SELECT
+        time_window = timedelta(minutes=30)
+        doctor_ok, conflict = (await self.db.execute(
+            select(
+                exists().where(
+                    User.id == doctor_id,
+                    User.role == UserRole.DOCTOR,
+                    User.is_active == True
+                ).label("doctor_ok"),
+                exists().where(
+                    Appointment.doctor_id == doctor_id,
+                    Appointment.scheduled_time.between(
+                        scheduled_time - time_window, scheduled_time + time_window
+                    ),
+                    Appointment.status.in_(
+                        [AppointmentStatus.WAITING, AppointmentStatus.IN_PROGRESS]
+                    )
+                ).label("conflict"),
+            )
+        )).one()
+
+        if not doctor_ok:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Doctor not found",
             )
-
-        # Check if doctor is available
-        if not self.check_doctor_availability(doctor_id, scheduled_time):
+        if conflict:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Doctor is not available at this time",
             )
 
-        # Create new appointment
+        # Create new appointment. No refresh afterwards: id, status and the
+        # timestamps are all client-side defaults populated at flush
         db_appointment = Appointment(
             patient_id=patient_id,
             doctor_id=doctor_id,
             scheduled_time=scheduled_time,
         )
         self.db.add(db_appointment)
-        self.db.commit()
-        self.db.refresh(db_appointment)
+        await self.db.commit()
 
         return db_appointment
 
-    def update_appointment(self, appointment_id: UUID, data: Dict[str, Any]) -> Appointment:
+    async def update_appointment(self, appointment_id: UUID, data: Dict[str, Any]) -> Appointment:
         """
         Update an appointment.
+
+        Plain field changes run as one UPDATE ... RETURNING round-trip.
+        Only a reschedule takes the select-then-update path, because the
+        current row is needed to re-check the doctor's availability.
         """
-        db_appointment = self.get_by_id(appointment_id)
+        values = {
+            key: value for key, value in data.items()
+            if value is not None and hasattr(Appointment, key)
+        }
+
+        if values and "scheduled_time" not in values:
+            row = (await self.db.execute(
+                update(Appointment)
+                .where(Appointment.id == appointment_id)
+                .values(**values)
+                .returning(*Appointment.__table__.columns)
+            )).one_or_none()
+            if row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Appointment not found",
+                )
+            await self.db.commit()
+            return Appointment(**row._mapping)
+
+        db_appointment = await self.get_by_id(appointment_id)
         if not db_appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -86,28 +127,26 @@ class AppointmentService:
             )
 
         # If updating scheduled time, check doctor availability
-        if "scheduled_time" in data and data["scheduled_time"] != db_appointment.scheduled_time:
-            if not self.check_doctor_availability(db_appointment.doctor_id, data["scheduled_time"]):
+        if "scheduled_time" in values and values["scheduled_time"] != db_appointment.scheduled_time:
+            if not await self.check_doctor_availability(db_appointment.doctor_id, values["scheduled_time"]):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Doctor is not available at this time",
                 )
 
         # Update fields
-        for key, value in data.items():
-            if hasattr(db_appointment, key) and value is not None:
-                setattr(db_appointment, key, value)
+        for key, value in values.items():
+            setattr(db_appointment, key, value)
 
-        self.db.commit()
-        self.db.refresh(db_appointment)
+        await self.db.commit()
 
         return db_appointment
 
-    def cancel_appointment(self, appointment_id: UUID) -> Appointment:
+    async def cancel_appointment(self, appointment_id: UUID) -> Appointment:
         """
         Cancel an appointment.
         """
-        db_appointment = self.get_by_id(appointment_id)
+        db_appointment = await self.get_by_id(appointment_id)
         if not db_appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -123,53 +162,78 @@ class AppointmentService:
 
         # Update status
         db_appointment.status = AppointmentStatus.CANCELLED
-        self.db.commit()
-        self.db.refresh(db_appointment)
+        await self.db.commit()
+        await self.db.refresh(db_appointment)
 
         return db_appointment
 
-    def get_user_appointments(
+    async def get_user_appointments(
             self, user_id: UUID, status: Optional[AppointmentStatus] = None,
-            start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+            start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+            lightweight: bool = False
     ) -> List[Appointment]:
         """
         Get appointments for a user.
+
+        With lightweight=True the query returns plain column tuples
+        (id, patient_id, doctor_id, scheduled_time, status) — no ORM
+        hydration, instrumentation or identity-map bookkeeping per row —
+        for callers that don't touch relationships.
         """
-        user = self.db.query(User).filter(User.id == user_id).first()
+        user = await self.db.get(User, user_id)
         if not user:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
+                status_code=404,
                 detail="User not found",
             )
 
-        query = self.db.query(Appointment)
+        if lightweight:
+            query = select(
+                Appointment.id,
+                Appointment.patient_id,
+                Appointment.doctor_id,
+                Appointment.scheduled_time,
+                Appointment.status,
+            )
+        else:
+            # Eager-load everything a serializer may touch in a constant
+            # number of queries; raiseload turns any remaining lazy access
+            # into an error instead of a silent N+1 (lazy loads would fail
+            # under the async session anyway)
+            query = select(Appointment).options(
+                selectinload(Appointment.doctor),
+                selectinload(Appointment.patient),
+                selectinload(Appointment.consultation),
+                raiseload("*"),
+            )
 
         # Filter by user role
         if user.role == UserRole.PATIENT:
-            query = query.filter(Appointment.patient_id == user_id)
+            query = query.where(Appointment.patient_id == user_id)
         elif user.role == UserRole.DOCTOR:
-            query = query.filter(Appointment.doctor_id == user_id)
+            query = query.where(Appointment.doctor_id == user_id)
 
         # Apply additional filters
         if status:
-            query = query.filter(Appointment.status == status)
+            query = query.where(Appointment.status == status)
 
         if start_date:
-            query = query.filter(Appointment.scheduled_time >= start_date)
+            query = query.where(Appointment.scheduled_time >= start_date)
 
         if end_date:
-            query = query.filter(Appointment.scheduled_time <= end_date)
+            query = query.where(Appointment.scheduled_time <= end_date)
 
         # Sort by scheduled time
         query = query.order_by(Appointment.scheduled_time)
 
-        return query.all()
+        result = await self.db.execute(query)
+        return result.all() if lightweight else result.scalars().all()
 
-    def get_queue_position(self, appointment_id: UUID) -> int:
+    async def get_queue_position(self, appointment_id: UUID) -> int:
         """
         Get the position of an appointment in the queue.
         """
-        db_appointment = self.get_by_id(appointment_id)
+        db_appointment = await self.get_by_id(appointment_id)
         if not db_appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -177,19 +241,43 @@ class AppointmentService:
             )
 
         # Count appointments scheduled before this one for the same doctor with WAITING status
-        position = self.db.query(func.count(Appointment.id)).filter(
-            Appointment.doctor_id == db_appointment.doctor_id,
-            Appointment.scheduled_time < db_appointment.scheduled_time,
-            Appointment.status == AppointmentStatus.WAITING
-        ).scalar()
+        position = await self.db.scalar(
+            select(func.count(Appointment.id)).where(
+                Appointment.doctor_id == db_appointment.doctor_id,
+                Appointment.scheduled_time < db_appointment.scheduled_time,
+                Appointment.status == AppointmentStatus.WAITING
+            )
+        )
 
         # Add 1 to get the position (1-based index)
         return position + 1
 
-    def get_estimated_wait_time(self, appointment_id: UUID) -> int:
+    async def get_positions_for_doctor(self, doctor_id: UUID) -> Dict[UUID, int]:
+        """
+        Get queue positions for every waiting appointment of a doctor.
+
+        One windowed query replaces a COUNT per appointment, so a
+        broadcast cycle that pushes positions to all waiting patients
+        costs a single round-trip however long the queue is.
+        """
+        rows = (await self.db.execute(
+            select(
+                Appointment.id,
+                func.row_number().over(
+                    order_by=Appointment.scheduled_time
+                ).label("position"),
+            ).where(
+                Appointment.doctor_id == doctor_id,
+                Appointment.status == AppointmentStatus.WAITING,
+            )
+        )).all()
+
+        return {appointment_id: position for appointment_id, position in rows}
+
+    async def get_estimated_wait_time(self, appointment_id: UUID) -> int:
         """
         Get the estimated wait time in minutes for an appointment.
         """
-        position = self.get_queue_position(appointment_id)
+        position = await self.get_queue_position(appointment_id)
         # Assume each appointment takes 15 minutes
-        return position * 15
\ No newline at end of file
+        return position * 15
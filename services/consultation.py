@@ -1,6 +1,8 @@
 from typing import Optional, List, Dict, Any
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
 from fastapi import HTTPException, status
 from datetime import datetime
 
@@ -10,29 +12,31 @@ from models.consultation import Consultation, Message, ConsultationType
 
 
 class ConsultationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_by_id(self, consultation_id: UUID) -> Optional[Consultation]:
+    async def get_by_id(self, consultation_id: UUID) -> Optional[Consultation]:
         """
         Get consultation by ID.
         """
-        return self.db.query(Consultation).filter(Consultation.id == consultation_id).first()
+        return await self.db.get(Consultation, consultation_id)
 
-    def get_by_appointment_id(self, appointment_id: UUID) -> Optional[Consultation]:
+    async def get_by_appointment_id(self, appointment_id: UUID) -> Optional[Consultation]:
         """
         Get consultation by appointment ID.
         """
-        return self.db.query(Consultation).filter(Consultation.appointment_id == appointment_id).first()
+        return (await self.db.execute(
+            select(Consultation).where(Consultation.appointment_id == appointment_id)
+        )).scalars().first()
 
-    def start_consultation(
+    async def start_consultation(
             self, appointment_id: UUID, consultation_type: ConsultationType
     ) -> Consultation:
         """
         Start a new consultation.
         """
         # Get the appointment
-        appointment = self.db.query(Appointment).filter(Appointment.id == appointment_id).first()
+        appointment = await self.db.get(Appointment, appointment_id)
         if not appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -47,7 +51,7 @@ class ConsultationService:
             )
 
         # Check if consultation already exists
-        existing_consultation = self.get_by_appointment_id(appointment_id)
+        existing_consultation = await self.get_by_appointment_id(appointment_id)
         if existing_consultation:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,16 +68,16 @@ class ConsultationService:
             started_at=datetime.utcnow(),
         )
         self.db.add(consultation)
-        self.db.commit()
-        self.db.refresh(consultation)
+        await self.db.commit()
+        await self.db.refresh(consultation)
 
         return consultation
 
-    def end_consultation(self, consultation_id: UUID, notes: Optional[str] = None) -> Consultation:
+    async def end_consultation(self, consultation_id: UUID, notes: Optional[str] = None) -> Consultation:
         """
         End a consultation.
         """
-        consultation = self.get_by_id(consultation_id)
+        consultation = await self.get_by_id(consultation_id)
         if not consultation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -88,7 +92,7 @@ class ConsultationService:
             )
 
         # Get the associated appointment
-        appointment = self.db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
+        appointment = await self.db.get(Appointment, consultation.appointment_id)
         if not appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -103,46 +107,56 @@ class ConsultationService:
         # Update appointment status
         appointment.status = AppointmentStatus.COMPLETED
 
-        self.db.commit()
-        self.db.refresh(consultation)
+        await self.db.commit()
+        await self.db.refresh(consultation)
 
         return consultation
 
-    def get_user_consultations(self, user_id: UUID) -> List[Consultation]:
+    async def get_user_consultations(self, user_id: UUID) -> List[Consultation]:
         """
         Get consultations for a user.
         """
-        user = self.db.query(User).filter(User.id == user_id).first()
+        user = await self.db.get(User, user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found",
             )
 
+        # Eager-load everything a serializer may touch in a constant number
+        # of queries; raiseload turns any remaining lazy access into an
+        # error instead of a silent N+1 (lazy loads would fail under the
+        # async session anyway)
+        base = select(Consultation).options(
+            selectinload(Consultation.appointment).selectinload(Appointment.doctor),
+            selectinload(Consultation.messages),
+            raiseload("*"),
+        )
+
         if user.role == UserRole.PATIENT:
             # Get consultations where user is the patient
-            consultations = self.db.query(Consultation).join(
+            query = base.join(
                 Appointment, Consultation.appointment_id == Appointment.id
-            ).filter(
+            ).where(
                 Appointment.patient_id == user_id
-            ).all()
+            )
         elif user.role == UserRole.DOCTOR:
             # Get consultations where user is the doctor
-            consultations = self.db.query(Consultation).join(
+            query = base.join(
                 Appointment, Consultation.appointment_id == Appointment.id
-            ).filter(
+            ).where(
                 Appointment.doctor_id == user_id
-            ).all()
+            )
         else:  # Admin can see all
-            consultations = self.db.query(Consultation).all()
+            query = base
 
-        return consultations
+        return (await self.db.execute(query)).scalars().all()
 
-    def add_message(self, consultation_id: UUID, sender_id: UUID, message_text: str) -> Message:
+    async def add_message(self, consultation_id: UUID, sender_id: UUID, message_text: str) -> Message:
         """
         Add a message to a consultation.
         """
-        consultation = self.get_by_id(consultation_id)
+        consultation = await self.get_by_id(consultation_id)
         if not consultation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -157,7 +171,7 @@ class ConsultationService:
             )
 
         # Get the associated appointment
-        appointment = self.db.query(Appointment).filter(Appointment.id == consultation.appointment_id).first()
+        appointment = await self.db.get(Appointment, consultation.appointment_id)
         if not appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -178,16 +192,16 @@ class ConsultationService:
             message=message_text,
         )
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        await self.db.commit()
+        await self.db.refresh(message)
 
         return message
 
-    def get_messages(self, consultation_id: UUID) -> List[Message]:
+    async def get_messages(self, consultation_id: UUID) -> List[Message]:
         """
         Get all messages in a consultation.
         """
-        consultation = self.get_by_id(consultation_id)
+        consultation = await self.get_by_id(consultation_id)
         if not consultation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -195,8 +209,8 @@ class ConsultationService:
             )
 
         # Get all messages in the consultation
-        messages = self.db.query(Message).filter(
-            Message.consultation_id == consultation_id
-        ).order_by(Message.timestamp).all()
-
-        return messages
\ No newline at end of file
+        return (await self.db.execute(
+            select(Message).where(
+                Message.consultation_id == consultation_id
+            ).order_by(Message.timestamp)
+        )).scalars().all()
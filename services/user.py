@@ -1,206 +1,425 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+import uuid
+from typing import Optional, List, Dict
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, func, insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from starlette.concurrency import run_in_threadpool
 from fastapi import HTTPException, status
 
 from models.user import User, Doctor, Patient, UserRole
-from core.security import get_password_hash, verify_password
+from schemas.user import (
+    UserCreate, UserUpdate,
+    DoctorCreate, DoctorUpdate,
+    PatientCreate, PatientUpdate,
+)
+from core.security import DUMMY_PASSWORD_HASH, get_password_hash, verify_password
+
+
+# 2.0-style statements built once at import: every call reuses the same
+# expression tree and hits the engine's compiled-query cache instead of
+# rebuilding and recompiling the SELECT per lookup.
+# Email matching is case-insensitive: rows are written lowercased, and the
+# lower() comparison (served by ix_users_email_lower) also catches legacy
+# mixed-case rows.
+_BY_EMAIL_STMT = select(User).where(func.lower(User.email) == bindparam("e"))
+_BY_USERNAME_STMT = select(User).where(User.username == bindparam("u"))
+
+# Columns the update methods may write. An explicit allow-list replaces a
+# hasattr() reflection probe per key and keeps callers from smuggling in
+# writes to instrumented attributes like password_hash or role.
+_USER_UPDATABLE = {"email", "username", "full_name", "is_active"}
+_DOCTOR_UPDATABLE = {"specialization", "bio", "working_hours"}
+_PATIENT_UPDATABLE = {"date_of_birth", "blood_group", "allergies"}
 
 
 class UserService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_by_id(self, user_id: UUID) -> Optional[User]:
+    async def get_by_id(self, user_id: UUID) -> Optional[User]:
         """
         Get user by ID.
+
+        Session.get checks the identity map first, so a repeat lookup in
+        the same request returns without compiling SQL or touching the DB.
+        """
+        return await self.db.get(User, user_id)
+
+    async def get_by_ids(self, user_ids: List[UUID]) -> Dict[UUID, User]:
         """
-        return self.db.query(User).filter(User.id == user_id).first()
+        Get several users by ID in one round-trip.
 
-    def get_by_email(self, email: str) -> Optional[User]:
+        Callers that would otherwise loop over get_by_id (serializing a
+        page of appointments, resolving both parties of a consultation)
+        collapse K SELECTs into a single WHERE id IN (...) query.
+        """
+        if not user_ids:
+            return {}
+        users = (await self.db.execute(
+            select(User).where(User.id.in_(list(set(user_ids))))
+        )).scalars().all()
+        return {user.id: user for user in users}
+
+    async def get_by_email(self, email: str) -> Optional[User]:
         """
         Get user by email.
         """
-        return self.db.query(User).filter(User.email == email).first()
+        return (await self.db.execute(
+            _BY_EMAIL_STMT, {"e": email.lower()}
+        )).scalar_one_or_none()
 
-    def get_by_username(self, username: str) -> Optional[User]:
+    async def get_by_username(self, username: str) -> Optional[User]:
         """
         Get user by username.
         """
-        return self.db.query(User).filter(User.username == username).first()
+        return (await self.db.execute(
+            _BY_USERNAME_STMT, {"u": username}
+        )).scalar_one_or_none()
 
-    def authenticate(self, username: str, password: str) -> Optional[User]:
+    async def authenticate(self, username: str, password: str) -> Optional[User]:
         """
         Authenticate user by username and password.
+
+        The hash verification runs whether or not the username exists
+        (against a precomputed dummy hash when it doesn't), so response
+        time does not reveal which usernames are registered. The non-
+        short-circuiting & keeps the combination branch-free as well.
+        Verification is pure CPU and runs in the threadpool so it doesn't
+        stall the event loop.
         """
-        user = self.get_by_username(username)
-        if not user:
-            return None
-        if not verify_password(password, user.password_hash):
-            return None
-        return user
+        user = await self.get_by_username(username)
+        ok = await run_in_threadpool(
+            verify_password,
+            password, user.password_hash if user else DUMMY_PASSWORD_HASH,
+        )
+        return user if (user is not None) & ok else None
 
-    def create_user(self, user_data: Dict[str, Any]) -> User:
+    async def _raise_on_conflict(self, email: str, username: str) -> None:
         """
-        Create a new user.
+        Raise a 400 if the email or username is already taken.
+
+        One OR'd SELECT answers both prechecks, so registration costs two
+        round-trips (check + insert) instead of three. Only the two columns
+        are fetched — no ORM hydration just to test existence.
         """
-        # Check if user with this email or username already exists
-        if self.get_by_email(user_data["email"]):
+        email = email.lower()
+        rows = (await self.db.execute(
+            select(User.email, User.username)
+            .where(or_(func.lower(User.email) == email, User.username == username))
+            .limit(2)
+        )).all()
+        # Email conflicts are reported first, matching the old two-query order
+        if any(row_email.lower() == email for row_email, _ in rows):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email already exists",
             )
-
-        if self.get_by_username(user_data["username"]):
+        if rows:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this username already exists",
             )
 
-        # Create user with hashed password
+    async def _create_user_row(self, user_in: UserCreate, role: Optional[UserRole] = None) -> User:
+        """
+        Stage a new user row without committing.
+
+        Flush materializes the generated id for profile-row foreign keys
+        while leaving the transaction open, so create_doctor/create_patient
+        can land both rows under a single commit.
+        """
+        # Check if user with this email or username already exists
+        await self._raise_on_conflict(user_in.email, user_in.username)
+
+        # Create user with hashed password; the KDF is pure CPU and runs
+        # in the threadpool so it doesn't stall the event loop
+        password_hash = await run_in_threadpool(get_password_hash, user_in.password)
         db_user = User(
-            email=user_data["email"],
-            username=user_data["username"],
-            full_name=user_data["full_name"],
-            password_hash=get_password_hash(user_data["password"]),
-            role=user_data["role"],
+            email=user_in.email.lower(),
+            username=user_in.username,
+            full_name=user_in.full_name,
+            password_hash=password_hash,
+            role=role or user_in.role,
         )
         self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
+        # The unique indexes on email/username are the real arbiter: two
+        # concurrent signups can both pass the precheck, and the loser's
+        # INSERT then violates the constraint. Map that to the same 400 the
+        # precheck would have raised instead of surfacing a 500.
+        try:
+            await self.db.flush()
+        except IntegrityError as exc:
+            await self.db.rollback()
+            field = "email" if "email" in str(exc.orig) else "username"
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"User with this {field} already exists",
+            )
+        return db_user
+
+    async def create_user(self, user_in: UserCreate) -> User:
+        """
+        Create a new user.
+        """
+        db_user = await self._create_user_row(user_in)
+        await self.db.commit()
 
         return db_user
 
-    def create_doctor(self, user_data: Dict[str, Any], doctor_data: Dict[str, Any]) -> Doctor:
+    async def create_doctor(self, doctor_in: DoctorCreate) -> Doctor:
         """
         Create a new doctor with user profile.
+
+        User and profile rows share one transaction: a single commit (one
+        WAL fsync) and no orphaned user if the profile insert fails.
         """
-        # Create user
-        user_data["role"] = UserRole.DOCTOR
-        db_user = self.create_user(user_data)
+        # Create user; the profile schema dictates the role
+        db_user = await self._create_user_row(doctor_in.user, role=UserRole.DOCTOR)
 
         # Create doctor profile
         db_doctor = Doctor(
             id=db_user.id,
-            specialization=doctor_data.get("specialization", "General"),
-            bio=doctor_data.get("bio", ""),
-            working_hours=doctor_data.get("working_hours", ""),
+            specialization=doctor_in.specialization,
+            bio=doctor_in.bio,
+            working_hours=doctor_in.working_hours,
         )
         self.db.add(db_doctor)
-        self.db.commit()
-        self.db.refresh(db_doctor)
+        await self.db.commit()
 
         return db_doctor
 
-    def create_patient(self, user_data: Dict[str, Any], patient_data: Dict[str, Any]) -> Patient:
+    async def create_patient(self, patient_in: PatientCreate) -> Patient:
         """
         Create a new patient with user profile.
+
+        Both rows land in one transaction, as in create_doctor.
         """
-        # Create user
-        user_data["role"] = UserRole.PATIENT
-        db_user = self.create_user(user_data)
+        # Create user; the profile schema dictates the role
+        db_user = await self._create_user_row(patient_in.user, role=UserRole.PATIENT)
 
         # Create patient profile
         db_patient = Patient(
             id=db_user.id,
-            date_of_birth=patient_data.get("date_of_birth"),
-            blood_group=patient_data.get("blood_group"),
-            allergies=patient_data.get("allergies"),
+            date_of_birth=patient_in.date_of_birth,
+            blood_group=patient_in.blood_group,
+            allergies=patient_in.allergies,
         )
         self.db.add(db_patient)
-        self.db.commit()
-        self.db.refresh(db_patient)
+        await self.db.commit()
 
         return db_patient
 
-    def update_user(self, user_id: UUID, user_data: Dict[str, Any]) -> User:
+    async def create_patients_bulk(self, rows: List[PatientCreate]) -> List[UUID]:
+        """
+        Create many patients (e.g. an admin import) in two INSERTs.
+
+        Each row is a PatientCreate as taken by create_patient. Password
+        hashing — the compute-bound part — is
+        spread across the threadpool concurrently, then all user rows and
+        all patient rows go in as two executemany INSERTs under one commit
+        instead of 2N round-trips. IDs are generated client-side so the
+        patient FKs need no RETURNING pass. Returns the new user IDs in
+        input order.
+
+        The import is all-or-nothing: on a uniqueness conflict the batch
+        is rolled back and replayed row by row inside a single
+        transaction to identify the offender, then rolled back again —
+        the 400 names the conflicting entry and nothing is persisted.
+        """
+        if not rows:
+            return []
+
+        hashes = await asyncio.gather(*(
+            run_in_threadpool(get_password_hash, row.user.password)
+            for row in rows
+        ))
+
+        ids = [uuid.uuid4() for _ in rows]
+        user_rows = [
+            {
+                "id": user_id,
+                "email": row.user.email.lower(),
+                "username": row.user.username,
+                "full_name": row.user.full_name,
+                "password_hash": password_hash,
+                "role": UserRole.PATIENT,
+            }
+            for row, user_id, password_hash in zip(rows, ids, hashes)
+        ]
+        patient_rows = [
+            {
+                "id": user_id,
+                "date_of_birth": row.date_of_birth,
+                "blood_group": row.blood_group,
+                "allergies": row.allergies,
+            }
+            for row, user_id in zip(rows, ids)
+        ]
+
+        try:
+            await self.db.execute(insert(User), user_rows)
+            await self.db.execute(insert(Patient), patient_rows)
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            # Replay row by row without committing; _create_user_row's
+            # per-row precheck and flush raise the precise 400 at the
+            # offender, and the rollback discards every earlier row so a
+            # failed import never persists a partial batch
+            ids = []
+            try:
+                for row in rows:
+                    db_user = await self._create_user_row(row.user, role=UserRole.PATIENT)
+                    self.db.add(Patient(
+                        id=db_user.id,
+                        date_of_birth=row.date_of_birth,
+                        blood_group=row.blood_group,
+                        allergies=row.allergies,
+                    ))
+                    ids.append(db_user.id)
+                await self.db.commit()
+            except HTTPException:
+                await self.db.rollback()
+                raise
+        return ids
+
+    async def update_user(self, user_id: UUID, user_in: UserUpdate) -> User:
         """
         Update user data.
         """
-        db_user = self.get_by_id(user_id)
+        db_user = await self.get_by_id(user_id)
         if not db_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found",
             )
 
-        # Update user fields
+        # The schema already validated the payload; exclude_unset keeps
+        # the loop to fields the caller actually sent
+        user_data = user_in.model_dump(exclude_unset=True)
+
+        # Hash the password at most once per call, outside the field loop —
+        # the KDF is by far the most expensive operation in this file
+        dirty = False
+        password = user_data.pop("password", None)
+        if password is not None:
+            db_user.password_hash = await run_in_threadpool(
+                get_password_hash, password
+            )
+            dirty = True
+
+        # Keep stored emails on their normalized lowercase form
+        if user_data.get("email"):
+            user_data["email"] = user_data["email"].lower()
+
+        # Update user fields; only values that actually differ mark the
+        # object dirty, so a PATCH that re-sends the current state costs
+        # no commit (and therefore no WAL flush)
         for key, value in user_data.items():
-            if hasattr(db_user, key) and value is not None:
-                # Handle password separately
-                if key == "password":
-                    db_user.password_hash = get_password_hash(value)
-                else:
+            if value is not None and key in _USER_UPDATABLE:
+                if getattr(db_user, key) != value:
                     setattr(db_user, key, value)
+                    dirty = True
 
-        self.db.commit()
-        self.db.refresh(db_user)
+        if dirty:
+            await self.db.commit()
 
         return db_user
 
-    def get_doctors(self, skip: int = 0, limit: int = 100) -> List[Doctor]:
+    async def get_doctors(
+            self, cursor: Optional[UUID] = None, limit: int = 100
+    ) -> List[Doctor]:
         """
-        Get list of doctors.
+        Get a page of doctors, keyset-paginated by (full_name, id).
+
+        The cursor is the id of the last doctor of the previous page; the
+        row-value comparison seeks straight to it, so page N costs the
+        same as page 1 where OFFSET would scan and discard every earlier
+        row. full_name is nullable, so ordering and seeking go through
+        coalesce — a NULL in a row comparison would otherwise make those
+        rows unreachable. The join already pulls the user row for
+        filtering; contains_eager reuses those columns to populate
+        Doctor.user, so serializers that touch doctor.user don't fire one
+        lazy SELECT per doctor.
         """
-        return (
-            self.db.query(Doctor)
-            .join(User)
-            .filter(User.role == UserRole.DOCTOR, User.is_active == True)
-            .offset(skip)
-            .limit(limit)
-            .all()
+        sort_name = func.coalesce(User.full_name, "")
+        query = (
+            select(Doctor)
+            .join(Doctor.user)
+            .options(contains_eager(Doctor.user))
+            .where(User.role == UserRole.DOCTOR, User.is_active == True)
         )
-
-    def get_doctor_by_id(self, doctor_id: UUID) -> Optional[Doctor]:
+        if cursor is not None:
+            cursor_name = await self.db.scalar(
+                select(func.coalesce(User.full_name, "")).where(User.id == cursor)
+            )
+            if cursor_name is not None:
+                query = query.where(
+                    tuple_(sort_name, Doctor.id) > (cursor_name, cursor)
+                )
+        return (await self.db.execute(
+            query.order_by(sort_name, Doctor.id).limit(limit)
+        )).scalars().all()
+
+    async def get_doctor_by_id(self, doctor_id: UUID) -> Optional[Doctor]:
         """
         Get doctor by ID.
         """
-        return self.db.query(Doctor).filter(Doctor.id == doctor_id).first()
+        return await self.db.get(Doctor, doctor_id)
 
-    def update_doctor(self, doctor_id: UUID, doctor_data: Dict[str, Any]) -> Doctor:
+    async def update_doctor(self, doctor_id: UUID, doctor_in: DoctorUpdate) -> Doctor:
         """
         Update doctor data.
         """
-        db_doctor = self.get_doctor_by_id(doctor_id)
+        db_doctor = await self.get_doctor_by_id(doctor_id)
         if not db_doctor:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Doctor not found",
             )
 
-        # Update doctor fields
-        for key, value in doctor_data.items():
-            if hasattr(db_doctor, key) and value is not None:
-                setattr(db_doctor, key, value)
+        # Update doctor fields, skipping the commit if nothing changed
+        dirty = False
+        for key, value in doctor_in.model_dump(exclude_unset=True).items():
+            if value is not None and key in _DOCTOR_UPDATABLE:
+                if getattr(db_doctor, key) != value:
+                    setattr(db_doctor, key, value)
+                    dirty = True
 
-        self.db.commit()
-        self.db.refresh(db_doctor)
+        if dirty:
+            await self.db.commit()
 
         return db_doctor
 
-    def get_patient_by_id(self, patient_id: UUID) -> Optional[Patient]:
+    async def get_patient_by_id(self, patient_id: UUID) -> Optional[Patient]:
         """
         Get patient by ID.
         """
-        return self.db.query(Patient).filter(Patient.id == patient_id).first()
+        return await self.db.get(Patient, patient_id)
 
-    def update_patient(self, patient_id: UUID, patient_data: Dict[str, Any]) -> Patient:
+    async def update_patient(self, patient_id: UUID, patient_in: PatientUpdate) -> Patient:
         """
         Update patient data.
         """
-        db_patient = self.get_patient_by_id(patient_id)
+        db_patient = await self.get_patient_by_id(patient_id)
         if not db_patient:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Patient not found",
             )
 
-        # Update patient fields
-        for key, value in patient_data.items():
-            if hasattr(db_patient, key) and value is not None:
-                setattr(db_patient, key, value)
+        # Update patient fields, skipping the commit if nothing changed
+        dirty = False
+        for key, value in patient_in.model_dump(exclude_unset=True).items():
+            if value is not None and key in _PATIENT_UPDATABLE:
+                if getattr(db_patient, key) != value:
+                    setattr(db_patient, key, value)
+                    dirty = True
 
-        self.db.commit()
-        self.db.refresh(db_patient)
+        if dirty:
+            await self.db.commit()
 
-        return db_patient
\ No newline at end of file
+        return db_patient